@@ -0,0 +1,89 @@
+from collections import OrderedDict
+from copy import copy
+from hashlib import sha256
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.permissions import SAFE_METHODS
+
+from recipes.versions import get_auth_version
+
+
+SHARED_KEY = 'api:token:{}'
+
+
+class TokenCache:
+    """LRU-кэш ограниченного размера, записи устаревают через ttl секунд."""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+_tokens = TokenCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL)
+
+
+class CachingTokenAuthentication(TokenAuthentication):
+    """
+    Аутентификация по токену без запроса к БД для недавно виденных
+    токенов. Пользователь и токен хранятся в LRU-кэше процесса
+    и, при TOKEN_CACHE_SHARED, в кэше Django. Запись действует,
+    пока не изменилась версия аутентификации пользователя: ее меняют
+    удаление токена (выход), сохранение пользователя (блокировка,
+    смена пароля) и его удаление. TTL ограничивает срок записи, если
+    версия сменилась между чтением из БД и сохранением в кэш.
+    Запросы на изменение читают пользователя из БД: представления
+    сохраняют request.user, а запись кэша могла устареть на TTL.
+    """
+
+    from_cache = True
+
+    def authenticate(self, request):
+        self.from_cache = request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def authenticate_credentials(self, key):
+        shared_key = SHARED_KEY.format(sha256(key.encode()).hexdigest())
+        entry = None
+        if self.from_cache:
+            entry = _tokens.get(key)
+            if entry is None and settings.TOKEN_CACHE_SHARED:
+                entry = cache.get(shared_key)
+        if entry is not None:
+            user, token, version = entry
+            if version == get_auth_version(user.pk):
+                _tokens.set(key, entry)
+                # Копия: представления могут менять request.user.
+                return copy(user), token
+        user, token = super().authenticate_credentials(key)
+        version = get_auth_version(user.pk)
+        if version is not None:
+            entry = (copy(user), token, version)
+            _tokens.set(key, entry)
+            if settings.TOKEN_CACHE_SHARED:
+                cache.set(shared_key, entry, settings.TOKEN_CACHE_TTL)
+        return user, token
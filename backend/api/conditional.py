@@ -0,0 +1,55 @@
+from hashlib import md5
+
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date, quote_etag
+
+
+NANOSECONDS = 10 ** 9
+
+
+class ConditionalResponseMixin:
+    """
+    ETag и Last-Modified для list и retrieve. Валидаторы считаются
+    до выборки и сериализации данных; если у клиента актуальная
+    версия, отдается 304 без тела.
+    """
+
+    def get_validators(self):
+        """
+        Пара (данные для ETag, время изменения в наносекундах)
+        или None, если ответ нельзя проверить заранее.
+        """
+        raise NotImplementedError
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs)
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        validators = self.get_validators()
+        if validators is None:
+            return handler(request, *args, **kwargs)
+        etag_data, last_modified = validators
+        etag = quote_etag(md5(repr(
+            (request.get_full_path(), *etag_data)
+        ).encode()).hexdigest())
+        last_modified = last_modified // NANOSECONDS
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Authorization',))
+        return response
@@ -0,0 +1,106 @@
+import binascii
+from tempfile import SpooledTemporaryFile
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.files import File
+from PIL import Image
+from rest_framework import serializers
+
+from recipes.images import get_variant_names
+
+
+BASE64_MARKER = ';base64,'
+HEADER_MAX_LENGTH = 64
+# Кратно 4, чтобы каждая часть декодировалась отдельно.
+DECODE_CHUNK_SIZE = 64 * 1024
+IMAGE_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+
+class Base64ImageField(serializers.ImageField):
+    """
+    Изображение в Base64 (строка или data URL). Строка декодируется
+    частями во временный файл с ограничением размера; формат и размеры
+    изображения проверяются до сохранения.
+    """
+
+    default_error_messages = {
+        'invalid': 'Загрузите изображение в кодировке Base64.',
+        'invalid_image': 'Загрузите корректное изображение.',
+        'invalid_format': 'Допустимые форматы: {formats}.',
+        'too_large': 'Размер изображения больше {max_size} байт.',
+        'too_many_pixels': 'Изображение больше {max_pixels} пикселей.',
+    }
+
+    def to_internal_value(self, data):
+        if data == '':
+            return None
+        if not isinstance(data, str):
+            self.fail('invalid')
+        start = data.find(BASE64_MARKER, 0, HEADER_MAX_LENGTH)
+        start = 0 if start == -1 else start + len(BASE64_MARKER)
+        max_size = settings.IMAGE_UPLOAD_MAX_SIZE
+        if (len(data) - start) // 4 * 3 > max_size:
+            self.fail('too_large', max_size=max_size)
+        file = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        rest = ''
+        try:
+            for position in range(start, len(data), DECODE_CHUNK_SIZE):
+                chunk = rest + ''.join(
+                    data[position:position + DECODE_CHUNK_SIZE].split())
+                end = len(chunk) - len(chunk) % 4
+                file.write(binascii.a2b_base64(chunk[:end]))
+                rest = chunk[end:]
+        except binascii.Error:
+            self.fail('invalid')
+        if rest or not file.tell():
+            self.fail('invalid')
+        return File(file, name=f'{uuid4().hex}.{self.get_extension(file)}')
+
+    def get_extension(self, file):
+        try:
+            file.seek(0)
+            with Image.open(file) as image:
+                image_format = image.format
+                width, height = image.size
+                image.verify()
+        except Exception:
+            self.fail('invalid_image')
+        if image_format not in IMAGE_EXTENSIONS:
+            self.fail(
+                'invalid_format', formats=', '.join(IMAGE_EXTENSIONS.values()))
+        if width * height > settings.IMAGE_MAX_PIXELS:
+            self.fail('too_many_pixels', max_pixels=settings.IMAGE_MAX_PIXELS)
+        file.seek(0)
+        return IMAGE_EXTENSIONS[image_format]
+
+
+class ImageVariantsField(serializers.Field):
+    """
+    URL вариантов изображения {вариант: URL}. Пока варианты
+    не подготовлены, вместо них отдается URL исходного изображения.
+    """
+
+    def __init__(self, image_field, variants_field, **kwargs):
+        self.image_field = image_field
+        self.variants_field = variants_field
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        image = getattr(instance, self.image_field)
+        if not image:
+            return None
+        names = get_variant_names(image.name)
+        if getattr(instance, self.variants_field) != names:
+            names = dict.fromkeys(names, image.name)
+        request = self.context.get('request')
+        return {
+            variant: (
+                request.build_absolute_uri(image.storage.url(name))
+                if request else image.storage.url(name)
+            )
+            for variant, name in names.items()
+        }
@@ -1,28 +1,49 @@
 from django_filters.rest_framework import filters, FilterSet
 from django.contrib.auth import get_user_model
+from django.db.models import Exists, OuterRef
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.catalog import get_catalog
+from recipes.models import Recipe
 
 User = get_user_model()
 
+TAGS_MATCH_ANY = 'any'
+TAGS_MATCH_ALL = 'all'
+TAGS_MATCH_CHOICES = (
+    (TAGS_MATCH_ANY, 'Любой из тегов'),
+    (TAGS_MATCH_ALL, 'Все теги'),
+)
+# Сортировки по популярности; каждой соответствует индекс Рецептов.
+RECIPES_ORDERINGS = {
+    'popular': ('-popularity', '-id'),
+    'trending': ('-trending', '-id'),
+}
+ORDERING_CHOICES = (
+    ('popular', 'Популярные'),
+    ('trending', 'Популярные за последнее время'),
+)
 
-class IngredientFilter(FilterSet):
-    """Фильтр по названию продукта."""
 
-    name = filters.CharFilter(field_name='name', lookup_expr='istartswith')
-
-    class Meta:
-        model = Ingredient
-        fields = ('name',)
+def get_tag_choices():
+    return [(tag.slug, tag.name) for tag in get_catalog().tags]
 
 
 class RecipesFilter(FilterSet):
-    """Фильтр по избранному, автору, списку покупок и тегам."""
+    """
+    Фильтр по избранному, автору, списку покупок и тегам.
+    Теги проверяются подзапросом EXISTS, поэтому рецепты не дублируются;
+    tags_match=all оставляет рецепты со всеми указанными тегами.
+    ordering=popular|trending сортирует по сохраненной популярности.
+    """
 
-    tags = filters.ModelMultipleChoiceFilter(
-        queryset=Tag.objects.all(),
-        field_name='tags__slug',
-        to_field_name='slug'
+    tags = filters.MultipleChoiceFilter(
+        choices=get_tag_choices,
+        method='get_tags',
+    )
+    tags_match = filters.ChoiceFilter(
+        choices=TAGS_MATCH_CHOICES,
+        method='get_tags_match',
+        label='Совпадение тегов',
     )
     is_favorited = filters.BooleanFilter(
         method='get_is_favorited',
@@ -32,16 +53,47 @@ class RecipesFilter(FilterSet):
         method='get_is_in_shopping_cart',
         label='В списке покупок'
     )
+    ordering = filters.ChoiceFilter(
+        choices=ORDERING_CHOICES,
+        method='get_ordering',
+        label='Сортировка',
+    )
 
     class Meta:
         model = Recipe
         fields = (
             'author',
             'tags',
+            'tags_match',
             'is_favorited',
             'is_in_shopping_cart',
+            'ordering',
         )
 
+    def get_tags(self, recipes, name, value):
+        # Каталог мог обновиться после проверки выбора: теги, которых
+        # в нем уже нет, не совпадают ни с одним рецептом.
+        tags_by_slug = get_catalog().tags_by_slug
+        tag_ids = [
+            tags_by_slug[slug].id for slug in value if slug in tags_by_slug
+        ]
+        recipe_tags = Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'))
+        if self.form.cleaned_data.get('tags_match') == TAGS_MATCH_ALL:
+            if len(tag_ids) < len(value):
+                return recipes.none()
+            for tag_id in tag_ids:
+                recipes = recipes.filter(
+                    Exists(recipe_tags.filter(tag=tag_id)))
+            return recipes
+        return recipes.filter(Exists(recipe_tags.filter(tag__in=tag_ids)))
+
+    def get_tags_match(self, recipes, name, value):
+        return recipes
+
+    def get_ordering(self, recipes, name, value):
+        return recipes.order_by(*RECIPES_ORDERINGS[value])
+
     def get_is_favorited(self, recipes, name, value):
         if self.request.user.is_authenticated and value == 1:
             return recipes.filter(favorites__user=self.request.user)
@@ -0,0 +1,238 @@
+import json
+import time
+from math import ceil
+
+import requests
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, Tag
+
+
+User = get_user_model()
+
+ITERATIONS = 50
+WARMUP = 3
+REMOTE_ADDR = '127.0.0.1'
+THROTTLE_KEYS = ('throttle_user_{user_id}', f'throttle_anon_{REMOTE_ADDR}')
+NO_DATA = ('В базе нет данных для замеров: заполните ее командой '
+           'seed_benchmark_data.')
+BAD_STATUS = '{scenario}: ответ {status} на {path}.'
+HEADER = '{:<24}{:>10}{:>10}{:>10}{:>10}{:>10}'
+ROW = '{:<24}{:>10.1f}{:>10.1f}{:>10}{:>10.1f}{:>10}'
+REGRESSION = 'p95 {scenario} вырос на {change:.0f}% (допустимо {limit}%).'
+SAVED = 'Результаты записаны в {path}.'
+
+
+def percentile(values, share):
+    """Процентиль по ближайшему рангу."""
+    values = sorted(values)
+    return values[max(ceil(share * len(values)) - 1, 0)]
+
+
+def get_scenarios():
+    """
+    Сценарии замеров: (название, путь, от имени пользователя ли).
+    Параметры берутся из самых популярных записей в базе.
+    """
+    recipe = Recipe.objects.order_by('-favorites_count').first()
+    user = User.objects.order_by('-subscriptions_count').first()
+    ingredient = Ingredient.objects.first()
+    if recipe is None or user is None or ingredient is None:
+        raise CommandError(NO_DATA)
+    author = User.objects.order_by('-recipes_count').first()
+    tags = '&'.join(
+        f'tags={slug}'
+        for slug in Tag.objects.values_list('slug', flat=True)[:2]
+    )
+    return user, (
+        ('recipes_feed', '/api/recipes/', False),
+        ('recipes_feed_filtered',
+         f'/api/recipes/?{tags}&is_favorited=1', True),
+        ('recipes_feed_author', f'/api/recipes/?author={author.id}', True),
+        ('recipe_retrieve', f'/api/recipes/{recipe.id}/', True),
+        ('subscriptions', '/api/users/subscriptions/?recipes_limit=3', True),
+        ('shopping_cart', '/api/recipes/download_shopping_cart/', True),
+        ('ingredients_search',
+         f'/api/ingredients/?name={ingredient.name[:3]}', False),
+    )
+
+
+class QueryCounter:
+    """Счетчик SQL-запросов соединения для connection.execute_wrapper."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class LocalClient:
+    """Запросы через тестовый клиент Django в этом же процессе."""
+
+    def __init__(self, user, token):
+        self.user = user
+        self.clients = {
+            False: Client(REMOTE_ADDR=REMOTE_ADDR),
+            True: Client(
+                REMOTE_ADDR=REMOTE_ADDR,
+                HTTP_AUTHORIZATION=f'Token {token}'
+            ),
+        }
+
+    def get(self, path, authorized):
+        # Лимиты запросов сбрасываются вне замера, иначе замер упрется
+        # в DEFAULT_THROTTLE_RATES.
+        cache.delete_many([
+            key.format(user_id=self.user.id) for key in THROTTLE_KEYS])
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            started = time.perf_counter()
+            response = self.clients[authorized].get(path)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+        return response.status_code, elapsed, counter.count
+
+
+class RemoteClient:
+    """Запросы к запущенному серверу; число SQL-запросов не известно."""
+
+    def __init__(self, url, token):
+        self.url = url.rstrip('/')
+        self.session = requests.Session()
+        self.token = token
+
+    def get(self, path, authorized):
+        headers = {'Authorization': f'Token {self.token}'}
+        started = time.perf_counter()
+        response = self.session.get(
+            self.url + path, headers=headers if authorized else {})
+        return response.status_code, time.perf_counter() - started, None
+
+
+class Command(BaseCommand):
+    """
+    Команда на замер основных эндпоинтов API: p50/p95 времени ответа,
+    число SQL-запросов на запрос и пропускная способность. Результаты
+    можно сохранить в JSON и сравнивать с ним следующие замеры.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=ITERATIONS,
+            help='Число замеряемых запросов на сценарий.'
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=WARMUP,
+            help='Число незамеряемых запросов перед замером.'
+        )
+        parser.add_argument(
+            '--url',
+            help='Адрес запущенного сервера; без него запросы идут '
+                 'через тестовый клиент Django.'
+        )
+        parser.add_argument(
+            '--output',
+            help='Записать результаты в JSON-файл.'
+        )
+        parser.add_argument(
+            '--baseline',
+            help='JSON-файл прошлого замера для сравнения.'
+        )
+        parser.add_argument(
+            '--max-regression',
+            type=float,
+            help='Ошибка, если p95 сценария вырос больше, чем на столько %%.'
+        )
+
+    def handle(self, *args, **options):
+        user, scenarios = get_scenarios()
+        token = Token.objects.get_or_create(user=user)[0].key
+        client = (
+            RemoteClient(options['url'], token) if options['url']
+            else LocalClient(user, token)
+        )
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']
+        ):
+            results = {
+                name: self.measure(
+                    client, name, path, authorized,
+                    options['iterations'], options['warmup']
+                )
+                for name, path, authorized in scenarios
+            }
+        baseline = {}
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)['results']
+        self.report(results, baseline, options['max_regression'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(
+                    {
+                        'database': connection.vendor,
+                        'url': options['url'],
+                        'iterations': options['iterations'],
+                        'results': results,
+                    },
+                    file,
+                    ensure_ascii=False,
+                    indent=2
+                )
+            self.stdout.write(SAVED.format(path=options['output']))
+
+    def measure(self, client, name, path, authorized, iterations, warmup):
+        timings = []
+        queries = []
+        for number in range(warmup + iterations):
+            status, elapsed, count = client.get(path, authorized)
+            if status != 200:
+                raise CommandError(
+                    BAD_STATUS.format(scenario=name, status=status, path=path))
+            if number >= warmup:
+                timings.append(elapsed)
+                queries.append(count)
+        return {
+            'path': path,
+            'p50_ms': percentile(timings, 0.5) * 1000,
+            'p95_ms': percentile(timings, 0.95) * 1000,
+            'queries': None if None in queries else max(queries),
+            'rps': len(timings) / sum(timings),
+        }
+
+    def report(self, results, baseline, max_regression):
+        self.stdout.write(HEADER.format(
+            'сценарий', 'p50, мс', 'p95, мс', 'запросов', 'запр./с',
+            'Δp95, %'))
+        regressions = []
+        for name, result in results.items():
+            change = '-'
+            if name in baseline:
+                change = round(
+                    (result['p95_ms'] / baseline[name]['p95_ms'] - 1) * 100)
+                if max_regression is not None and change > max_regression:
+                    regressions.append(REGRESSION.format(
+                        scenario=name, change=change, limit=max_regression))
+            self.stdout.write(ROW.format(
+                name,
+                result['p50_ms'],
+                result['p95_ms'],
+                '-' if result['queries'] is None else result['queries'],
+                result['rps'],
+                change,
+            ))
+        if regressions:
+            raise CommandError('\n'.join(regressions))
@@ -0,0 +1,227 @@
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from .benchmark_api import THROTTLE_KEYS, percentile
+
+
+User = get_user_model()
+
+MODES = ('wsgi', 'asgi')
+HOST = '127.0.0.1'
+TIMEOUT = 30
+STARTUP_TIMEOUT = 30
+SLOW_PIECES = 10
+SLOW_READ_SIZE = 1024
+SLOW_READ_PAUSE = 0.05
+REQUEST = ('GET {path} HTTP/1.1\r\nHost: {host}\r\n'
+           'Authorization: Token {token}\r\nConnection: close\r\n\r\n')
+NO_USERS = ('В базе нет пользователей: заполните ее командой '
+            'seed_benchmark_data.')
+NOT_STARTED = 'Сервер {mode} не ответил за {timeout} с.'
+HEADER = '{:<8}{:>10}{:>10}{:>10}{:>10}{:>10}'
+ROW = '{:<8}{:>10}{:>10.1f}{:>10.1f}{:>10.1f}{:>10}'
+
+
+def send_request(request, slow=None):
+    """
+    Один запрос с новым соединением; медленный клиент отправляет запрос
+    частями и читает ответ понемногу. Возвращает код ответа или None.
+    """
+    with socket.create_connection((HOST, request.port), TIMEOUT) as sock:
+        if slow is None:
+            sock.sendall(request.data)
+        else:
+            size = -(-len(request.data) // SLOW_PIECES)
+            for start in range(0, len(request.data), size):
+                sock.sendall(request.data[start:start + size])
+                if slow.wait(request.slow_delay / SLOW_PIECES):
+                    return None
+        response = b''
+        while True:
+            chunk = sock.recv(SLOW_READ_SIZE if slow else 64 * 1024)
+            if not chunk:
+                break
+            response += chunk
+            if slow is not None and slow.wait(SLOW_READ_PAUSE):
+                return None
+    status = response.split(b' ', 2)[1:2]
+    return int(status[0]) if status and status[0].isdigit() else None
+
+
+class Request:
+    def __init__(self, port, path, token, slow_delay):
+        self.port = port
+        self.data = REQUEST.format(
+            path=path, host=HOST, token=token).encode()
+        self.slow_delay = slow_delay
+
+
+class Load:
+    """
+    Нагрузка на сервер: медленные клиенты держат соединения, быстрые
+    отправляют запросы подряд и замеряют время ответа.
+    """
+
+    def __init__(self, request, fast_clients, slow_clients):
+        self.request = request
+        self.fast_clients = fast_clients
+        self.slow_clients = slow_clients
+        self.stop = threading.Event()
+        self.timings = []
+        self.errors = 0
+
+    def fast(self):
+        while not self.stop.is_set():
+            started = time.perf_counter()
+            try:
+                status = send_request(self.request)
+            except OSError:
+                status = None
+            if status == 200:
+                self.timings.append(time.perf_counter() - started)
+            elif not self.stop.is_set():
+                self.errors += 1
+
+    def slow(self):
+        while not self.stop.is_set():
+            try:
+                send_request(self.request, slow=self.stop)
+            except OSError:
+                self.stop.wait(SLOW_READ_PAUSE)
+
+    def run(self, duration):
+        threads = [
+            threading.Thread(target=self.slow, daemon=True)
+            for _ in range(self.slow_clients)
+        ]
+        for thread in threads:
+            thread.start()
+        # Быстрые клиенты стартуют, когда медленные уже заняли соединения.
+        self.stop.wait(self.request.slow_delay / 2)
+        fast_threads = [
+            threading.Thread(target=self.fast, daemon=True)
+            for _ in range(self.fast_clients)
+        ]
+        for thread in fast_threads:
+            thread.start()
+        time.sleep(duration)
+        self.stop.set()
+        for thread in (*threads, *fast_threads):
+            thread.join(TIMEOUT)
+        return {
+            'requests': len(self.timings),
+            'rps': len(self.timings) / duration,
+            'p50_ms': percentile(self.timings, 0.5) * 1000
+            if self.timings else 0,
+            'p95_ms': percentile(self.timings, 0.95) * 1000
+            if self.timings else 0,
+            'errors': self.errors,
+        }
+
+
+class Command(BaseCommand):
+    """
+    Команда на сравнение WSGI и ASGI под нагрузкой медленных клиентов.
+    Для каждого режима запускается gunicorn с настройками проекта
+    и одинаковым числом воркеров; медленные клиенты долго отправляют
+    запрос и читают ответ, а быстрые замеряют время ответа
+    и пропускную способность.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--modes', nargs='+', choices=MODES, default=MODES,
+            help='Режимы сервера для сравнения.')
+        parser.add_argument(
+            '--workers', type=int, default=2,
+            help='Число воркеров gunicorn.')
+        parser.add_argument(
+            '--port', type=int, default=8765,
+            help='Порт для запуска сервера.')
+        parser.add_argument(
+            '--path', default='/api/recipes/',
+            help='Путь для запросов.')
+        parser.add_argument(
+            '--fast-clients', type=int, default=8,
+            help='Число быстрых клиентов.')
+        parser.add_argument(
+            '--slow-clients', type=int, default=16,
+            help='Число медленных клиентов.')
+        parser.add_argument(
+            '--slow-delay', type=float, default=2,
+            help='За сколько секунд медленный клиент отправляет запрос.')
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Длительность замера в секундах.')
+
+    def handle(self, *args, **options):
+        user = User.objects.order_by('-recipes_count').first()
+        if user is None:
+            raise CommandError(NO_USERS)
+        token = Token.objects.get_or_create(user=user)[0].key
+        request = Request(
+            options['port'], options['path'], token, options['slow_delay'])
+        self.stdout.write(HEADER.format(
+            'режим', 'ответов', 'запр./с', 'p50, мс', 'p95, мс', 'ошибок'))
+        for mode in options['modes']:
+            cache.delete_many([
+                key.format(user_id=user.id) for key in THROTTLE_KEYS])
+            with self.server(mode, options['workers'], request):
+                result = Load(
+                    request, options['fast_clients'], options['slow_clients']
+                ).run(options['duration'])
+            self.stdout.write(ROW.format(
+                mode,
+                result['requests'],
+                result['rps'],
+                result['p50_ms'],
+                result['p95_ms'],
+                result['errors'],
+            ))
+
+    @contextmanager
+    def server(self, mode, workers, request):
+        process = subprocess.Popen(
+            [
+                sys.executable, '-m', 'gunicorn',
+                '--config', 'gunicorn.conf.py',
+                '--bind', f'{HOST}:{request.port}',
+                '--workers', str(workers),
+            ],
+            cwd=settings.BASE_DIR,
+            env={
+                **os.environ,
+                'SERVER_MODE': mode,
+                'ALLOWED_HOSTS': ' '.join((*settings.ALLOWED_HOSTS, HOST)),
+            },
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            self.wait_for_server(mode, request)
+            yield
+        finally:
+            process.terminate()
+            process.wait(TIMEOUT)
+
+    def wait_for_server(self, mode, request):
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            try:
+                if send_request(request) == 200:
+                    return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(
+            NOT_STARTED.format(mode=mode, timeout=STARTUP_TIMEOUT))
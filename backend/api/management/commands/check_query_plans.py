@@ -0,0 +1,113 @@
+import re
+from itertools import combinations
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+
+from api.filters import RecipesFilter
+from recipes.models import Favorite, Recipe, ShoppingCart, Tag
+
+
+User = get_user_model()
+
+PAGE_SIZE = 6
+# Таблицы, которые растут вместе с данными: их нельзя читать целиком.
+LARGE_TABLES = (
+    Recipe._meta.db_table,
+    Recipe.tags.through._meta.db_table,
+    Favorite._meta.db_table,
+    ShoppingCart._meta.db_table,
+)
+# Индексы, которые должны быть в плане при данном наборе фильтров.
+EXPECTED_INDEXES = {
+    (): ('recipe_pub_date_name_idx',),
+    ('author',): ('recipe_author_pub_date_idx',),
+    ('tags',): ('recipe_pub_date_name_idx',),
+    ('ordering',): ('recipe_popularity_id_idx',),
+    ('is_favorited', 'is_in_shopping_cart'): (
+        'favorite_recipe_user_idx',
+        'shoppingcart_recipe_user_idx',
+    ),
+}
+SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')
+INDEX_SCAN = re.compile(
+    r'Index (?:Only )?Scan(?: Backward)? (?:using|on) (\w+)')
+ONLY_POSTGRESQL = 'Проверка планов запросов работает только с PostgreSQL.'
+NO_DATA = 'В базе нет рецептов: заполните ее, например, seed-данными.'
+PLAN_OK = 'OK    {filters}'
+PLAN_FAILED = 'FAIL  {filters}: {problems}\n{plan}'
+SEQ_SCAN_PROBLEM = 'последовательное сканирование {table}'
+NO_INDEX_PROBLEM = 'нет индекса {index}'
+FAILED = 'Планы без нужных индексов: {count}.'
+
+
+class Command(BaseCommand):
+    """
+    Команда на проверку планов запросов ленты Рецептов: EXPLAIN
+    для всех сочетаний фильтров RecipesFilter. В плане не должно быть
+    последовательного сканирования больших таблиц (LARGE_TABLES),
+    а для сочетаний из EXPECTED_INDEXES - должны быть их индексы.
+    Планировщик выбирает индексы по статистике, поэтому проверка имеет
+    смысл на реалистичном объеме данных после ANALYZE.
+    """
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError(ONLY_POSTGRESQL)
+        recipe = Recipe.objects.select_related('author').first()
+        if recipe is None:
+            raise CommandError(NO_DATA)
+        user = (
+            User.objects.filter(favorites__isnull=False).first()
+            or recipe.author
+        )
+        filters = {
+            'author': recipe.author.pk,
+            'tags': list(Tag.objects.values_list('slug', flat=True)[:2]),
+            'is_favorited': 1,
+            'is_in_shopping_cart': 1,
+            'ordering': 'popular',
+        }
+        failed = 0
+        for size in range(len(filters) + 1):
+            for names in combinations(filters, size):
+                plan = self.explain(
+                    user, {name: filters[name] for name in names})
+                problems = self.get_problems(names, plan)
+                if problems:
+                    failed += 1
+                    self.stdout.write(PLAN_FAILED.format(
+                        filters=', '.join(names) or '-',
+                        problems=', '.join(problems),
+                        plan=plan
+                    ))
+                else:
+                    self.stdout.write(PLAN_OK.format(
+                        filters=', '.join(names) or '-'))
+        if failed:
+            raise CommandError(FAILED.format(count=failed))
+
+    @staticmethod
+    def get_problems(names, plan):
+        scanned = set(SEQ_SCAN.findall(plan))
+        used = set(INDEX_SCAN.findall(plan))
+        return [
+            SEQ_SCAN_PROBLEM.format(table=table)
+            for table in LARGE_TABLES if table in scanned
+        ] + [
+            NO_INDEX_PROBLEM.format(index=index)
+            for index in EXPECTED_INDEXES.get(names, ())
+            if index not in used
+        ]
+
+    @staticmethod
+    def explain(user, filters):
+        request = RequestFactory().get('/api/recipes/', filters)
+        request.user = user
+        return RecipesFilter(
+            request.GET,
+            queryset=Recipe.objects.for_reading(user),
+            request=request
+        ).qs[:PAGE_SIZE].explain()
@@ -1,6 +1,135 @@
-from rest_framework.pagination import PageNumberPagination
+from collections import OrderedDict
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    Cursor,
+    CursorPagination,
+    PageNumberPagination,
+)
+from rest_framework.response import Response
+
+from .filters import RECIPES_ORDERINGS
+from recipes.paginators import PrimaryKeyCountPaginator, after
+
+
+PAGE_SIZE = 6
+
+
+class CursorPaginationWithLimit(CursorPagination):
+    page_size_query_param = 'limit'
+    page_size = PAGE_SIZE
 
 
 class PageNumberPaginationWithLimit(PageNumberPagination):
+    """
+    Постраничная пагинация с параметром limit. Если в запросе есть
+    параметр cursor, включается пагинация по ключу cursor_ordering:
+    без подсчета общего числа объектов и без OFFSET.
+    """
+
     page_size_query_param = 'limit'
-    page_size = 6
+    page_size = PAGE_SIZE
+    cursor_ordering = None
+    cursor_pagination_class = CursorPaginationWithLimit
+    django_paginator_class = PrimaryKeyCountPaginator
+
+    def get_cursor_ordering(self, request):
+        return self.cursor_ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        cursor_ordering = self.get_cursor_ordering(request)
+        if cursor_ordering and 'cursor' in request.query_params:
+            self.cursor_paginator = self.cursor_pagination_class()
+            self.cursor_paginator.ordering = cursor_ordering
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+        self.cursor_paginator = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class KeysetPagination(CursorPaginationWithLimit):
+    """
+    Пагинация по ключу (значение первого поля ordering, id) последнего
+    объекта страницы; оба поля сортируются по убыванию. CursorPagination
+    хранит только значение первого поля и смещение и на длинных сериях
+    одинаковых значений (например, нулевой популярности) повторяет
+    страницы; ключ с id однозначен. Без подсчета и OFFSET, только ссылка
+    на следующую страницу.
+    """
+
+    ordering = ('-pub_date', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        name = self.ordering[0].lstrip('-')
+
+        def get_page(position, limit):
+            objects = queryset
+            if position is not None:
+                objects = objects.filter(after(position, name, 'id'))
+            return list(objects.order_by(*self.ordering)[:limit])
+
+        return self.paginate_keys(
+            get_page,
+            request,
+            to_python=queryset.model._meta.get_field(name).to_python,
+            get_key=lambda instance: (getattr(instance, name), instance.pk),
+        )
+
+    def paginate_keys(self, get_page, request,
+                      to_python=datetime.fromisoformat, get_key=tuple):
+        """
+        Страница из функции get_page(позиция, число); get_key дает ключ
+        (значение, id) объекта страницы, to_python - значение из курсора.
+        """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.get_key = get_key
+        cursor = self.decode_cursor(request)
+        position = None
+        if cursor is not None and cursor.position is not None:
+            try:
+                value, pk = cursor.position.rsplit(' ', 1)
+                position = (to_python(value), int(pk))
+            except (ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        page = get_page(position, self.page_size + 1)
+        self.has_next = len(page) > self.page_size
+        self.page = page[:self.page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        value, pk = self.get_key(self.page[-1])
+        value = value.isoformat() if isinstance(value, datetime) else repr(
+            value)
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=False, position=f'{value} {pk}'))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict((
+            ('next', self.get_next_link()),
+            ('previous', None),
+            ('results', data),
+        )))
+
+
+class RecipesPagination(PageNumberPaginationWithLimit):
+    cursor_ordering = ('-pub_date', '-id')
+    cursor_pagination_class = KeysetPagination
+
+    def get_cursor_ordering(self, request):
+        return RECIPES_ORDERINGS.get(
+            request.query_params.get('ordering'), self.cursor_ordering)
+
+
+class UsersPagination(PageNumberPaginationWithLimit):
+    cursor_ordering = ('username',)
@@ -1,10 +1,11 @@
 from collections import Counter
 
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from djoser.serializers import UserSerializer as BaseUserSerializer
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
+from config.instrumentation import TimedSerializerMixin
 from recipes.models import (
     Favorite,
     Ingredient,
@@ -12,10 +13,13 @@ from recipes.models import (
     Recipe,
     RecipeIngridients,
     ShoppingCart,
+    ShoppingCartTotal,
     Subscription,
     Tag,
 )
 
+from .fields import Base64ImageField, ImageVariantsField
+
 
 User = get_user_model()
 
@@ -32,6 +36,7 @@ class UserSerializer(BaseUserSerializer):
     """Сериализатор для работы с моделью Пользователя."""
 
     is_subscribed = serializers.SerializerMethodField()
+    avatar_variants = ImageVariantsField('avatar', 'avatar_variants')
 
     class Meta():
         model = User
@@ -39,9 +44,13 @@ class UserSerializer(BaseUserSerializer):
             *BaseUserSerializer.Meta.fields,
             'is_subscribed',
             'avatar',
+            'avatar_variants',
         )
 
     def get_is_subscribed(self, instance):
+        is_subscribed = getattr(instance, 'is_subscribed', None)
+        if is_subscribed is not None:
+            return is_subscribed
         user = self.context['request'].user
         return (
             user.is_authenticated
@@ -62,14 +71,11 @@ class AvatarSerializer(serializers.ModelSerializer):
         fields = ('avatar',)
 
 
-class UserInSubscriptionsSerializer(UserSerializer):
+class UserInSubscriptionsSerializer(TimedSerializerMixin, UserSerializer):
     """Сериализатор для представления Пользователя в Подписках."""
 
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(
-        source='recipes.count',
-        read_only=True
-    )
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta():
         model = User
@@ -81,8 +87,7 @@ class UserInSubscriptionsSerializer(UserSerializer):
 
     def get_recipes(self, instance):
         return ShortRecipeSerializer(
-            instance.recipes.all()[:int(
-                self.context['request'].GET.get('recipes_limit', 10**10))],
+            instance.limited_recipes,
             many=True
         ).data
 
@@ -90,9 +95,11 @@ class UserInSubscriptionsSerializer(UserSerializer):
 class ShortRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор сокращенного Рецепта."""
 
+    image_variants = ImageVariantsField('image', 'image_variants')
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
         read_only_fields = fields
 
 
@@ -127,7 +134,7 @@ class IngredientForRecipeSerialiser(serializers.ModelSerializer):
         read_only_fields = fields
 
 
-class ReadRecipeSerialiser(serializers.ModelSerializer):
+class ReadRecipeSerialiser(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для списка Рецептов."""
 
     tags = TagSerializer(many=True)
@@ -138,6 +145,7 @@ class ReadRecipeSerialiser(serializers.ModelSerializer):
     )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField('image', 'image_variants')
 
     class Meta:
         model = Recipe
@@ -150,24 +158,36 @@ class ReadRecipeSerialiser(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time',
+            'favorites_count',
         )
         read_only_fields = fields
 
     def get_is_favorited(self, instance):
-        return self.is_user_chosen_recipe(Favorite, instance)
+        return self.is_user_chosen_recipe(Favorite, instance, 'is_favorited')
 
     def get_is_in_shopping_cart(self, instance):
-        return self.is_user_chosen_recipe(ShoppingCart, instance)
+        return self.is_user_chosen_recipe(
+            ShoppingCart, instance, 'is_in_shopping_cart')
 
-    def is_user_chosen_recipe(self, model, instance):
+    def is_user_chosen_recipe(self, model, instance, annotation):
+        is_chosen = getattr(instance, annotation, None)
+        if is_chosen is not None:
+            return is_chosen
         user = self.context['request'].user
         return (
             user.is_authenticated
             and model.objects.filter(user=user, recipe=instance).exists()
         )
 
+    def to_representation(self, instance):
+        is_author_subscribed = getattr(instance, 'is_author_subscribed', None)
+        if is_author_subscribed is not None:
+            instance.author.is_subscribed = is_author_subscribed
+        return super().to_representation(instance)
+
 
 class AddIngredientInRecipeSerialiser(serializers.ModelSerializer):
     """Сериализатор для добавления Продукта в Рецепт."""
@@ -235,11 +255,17 @@ class WriteRecipeSerialiser(serializers.ModelSerializer):
         self.add_ingredients_and_tags(recipe, tags, ingredients)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        tags = validated_data.pop('tags', instance.tags)
-        ingredients = validated_data.pop('ingredients', instance.ingredients)
-        instance.ingredients.clear()
-        self.add_ingredients_and_tags(instance, tags, ingredients)
+        if 'tags' in validated_data:
+            instance.tags.set(validated_data.pop('tags'))
+        if 'ingredients' in validated_data:
+            amounts = {
+                ingredient['id'].id: ingredient['amount']
+                for ingredient in validated_data.pop('ingredients')
+            }
+            ShoppingCartTotal.objects.change_recipe_amounts(
+                instance, instance.set_ingredient_amounts(amounts), amounts)
         return super().update(instance, validated_data)
 
     @staticmethod
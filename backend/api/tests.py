@@ -0,0 +1,350 @@
+from io import StringIO
+from random import Random
+from unittest import skipUnless
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngridients,
+    ShoppingCart,
+    Subscription,
+    Tag,
+    User,
+)
+from recipes.versions import RECIPES_LIST_VERSION_KEY, bump_version
+
+from .filters import TAGS_MATCH_ALL, TAGS_MATCH_ANY, RecipesFilter
+from .serializers import WriteRecipeSerialiser
+from .views import RECIPES_LIMIT, RECIPES_LIMIT_DEFAULT
+
+
+RECIPES_NUMBER = 60
+PAGE_SIZES = (5, 10, 50)
+PLANS_USERS_NUMBER = 100
+PLANS_TAGS_NUMBER = 6
+PLANS_RECIPES_NUMBER = 10000
+PLANS_FAVORITES_NUMBER = 30
+PLANS_SHOPPING_CARTS_NUMBER = 10
+
+
+class RecipeQueriesTest(TestCase):
+    """
+    Число запросов к БД списка и карточки Рецептов не зависит от размера
+    страницы: признаки пользователя читаются вместе с Рецептами, теги
+    и Продукты - одним запросом на страницу, а не на каждый Рецепт.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader = (
+            User.objects.create_user(
+                username=username,
+                email=f'{username}@example.com',
+                password='password',
+                first_name='Имя',
+                last_name='Фамилия',
+            )
+            for username in ('author', 'reader')
+        )
+        cls.token = Token.objects.create(user=cls.reader)
+        tags = [
+            Tag.objects.create(name=f'Тег {number}', slug=f'tag-{number}')
+            for number in range(2)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Продукт {number}', measurement_unit='г')
+            for number in range(3)
+        ]
+        for number in range(RECIPES_NUMBER):
+            recipe = Recipe.objects.create(
+                author=cls.author,
+                name=f'Рецепт {number}',
+                image='recipes_images/recipe.png',
+                text='Описание',
+                cooking_time=10,
+            )
+            recipe.tags.set(tags)
+            RecipeIngridients.objects.bulk_create(
+                RecipeIngridients(
+                    recipe=recipe, ingredient=ingredient, amount=100)
+                for ingredient in ingredients
+            )
+            Favorite.objects.create(user=cls.reader, recipe=recipe)
+            ShoppingCart.objects.create(user=cls.reader, recipe=recipe)
+        Subscription.objects.create(user=cls.reader, author=cls.author)
+        cls.recipe = recipe
+
+    def setUp(self):
+        caches['default'].clear()
+        caches['versions'].clear()
+        self.auth = {'HTTP_AUTHORIZATION': f'Token {self.token.key}'}
+
+    def assertQueries(self, number, url, data=None, **headers):
+        # Первый запрос загружает каталог тегов и Продуктов и запоминает
+        # токен в кэше процесса.
+        self.client.get(url, data, **headers)
+        with self.assertNumQueries(number):
+            response = self.client.get(url, data, **headers)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_list(self):
+        url = reverse('api:recipes-list')
+        for limit in PAGE_SIZES:
+            with self.subTest(limit=limit):
+                response = self.assertQueries(6, url, {'limit': limit})
+                self.assertEqual(len(response.json()['results']), limit)
+                self.assertEqual(response.json()['count'], RECIPES_NUMBER)
+                response = self.assertQueries(
+                    6, url, {'limit': limit}, **self.auth)
+                self.assertTrue(all(
+                    recipe['is_favorited'] and recipe['is_in_shopping_cart']
+                    for recipe in response.json()['results']
+                ))
+
+    def test_detail(self):
+        url = reverse('api:recipes-detail', args=[self.recipe.pk])
+        self.assertQueries(5, url)
+        response = self.assertQueries(5, url, **self.auth)
+        self.assertTrue(response.json()['author']['is_subscribed'])
+
+    def test_subscriptions(self):
+        url = reverse('api:users-subscribtions')
+        recipe_ids = [
+            recipe['id'] for recipe in self.client.get(
+                reverse('api:recipes-list'),
+                {'limit': RECIPES_NUMBER}
+            ).json()['results']
+        ]
+        for recipes_limit, number in (
+            ({}, RECIPES_LIMIT_DEFAULT),
+            ({'recipes_limit': 3}, 3),
+            ({'recipes_limit': 0}, 0),
+        ):
+            with self.subTest(**recipes_limit):
+                author, = self.assertQueries(
+                    3, url, recipes_limit, **self.auth).json()['results']
+                self.assertEqual(
+                    [recipe['id'] for recipe in author['recipes']],
+                    recipe_ids[:number]
+                )
+                self.assertEqual(author['recipes_count'], RECIPES_NUMBER)
+        for recipes_limit in ('x', '-1', RECIPES_LIMIT + 1):
+            with self.subTest(recipes_limit=recipes_limit):
+                response = self.client.get(
+                    url, {'recipes_limit': recipes_limit}, **self.auth)
+                self.assertEqual(response.status_code, 400)
+
+    def test_list_validators_read_page_only(self):
+        url = reverse('api:recipes-list')
+        data = {'limit': 5, 'page': 2}
+        etag = self.client.get(url, data)['ETag']
+        page_ids = [
+            recipe['id']
+            for recipe in self.client.get(url, data).json()['results']
+        ]
+        other = Recipe.objects.exclude(pk__in=page_ids).first()
+        Recipe.objects.filter(pk=other.pk).update(updated_at=timezone.now())
+        with self.assertNumQueries(1):
+            response = self.client.get(url, data, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        for change in (
+            lambda: bump_version(RECIPES_LIST_VERSION_KEY),
+            lambda: Recipe.objects.filter(pk=page_ids[-1]).update(
+                updated_at=timezone.now()),
+        ):
+            change()
+            response = self.client.get(url, data, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            etag = response['ETag']
+
+
+class CountersSaveTest(TestCase):
+    """
+    Сохранение пользователя и Рецепта, загруженных до изменения
+    счетчиков, не затирает счетчики.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader = (
+            User.objects.create_user(
+                username=username,
+                email=f'{username}@example.com',
+                password='password',
+                first_name='Имя',
+                last_name='Фамилия',
+            )
+            for username in ('author', 'reader')
+        )
+        cls.token = Token.objects.create(user=cls.reader)
+        cls.recipe = Recipe.objects.create(
+            author=cls.author,
+            name='Рецепт',
+            image='recipes_images/recipe.png',
+            text='Описание',
+            cooking_time=10,
+        )
+
+    def setUp(self):
+        caches['default'].clear()
+        caches['versions'].clear()
+        self.auth = {'HTTP_AUTHORIZATION': f'Token {self.token.key}'}
+        # Пользователь запроса запоминается в кэше токенов до подписки.
+        self.client.get(reverse('api:users-me'), **self.auth)
+        self.client.post(
+            reverse('api:users-subscribe', args=[self.author.pk]),
+            **self.auth
+        )
+
+    def assertSubscriptionsCount(self):
+        self.reader.refresh_from_db()
+        self.assertEqual(self.reader.subscriptions_count, 1)
+
+    def test_delete_avatar(self):
+        response = self.client.delete(
+            reverse('api:users-me-avatar'), **self.auth)
+        self.assertEqual(response.status_code, 204)
+        self.assertSubscriptionsCount()
+
+    def test_patch_me(self):
+        response = self.client.patch(
+            reverse('api:users-me'),
+            {'first_name': 'Новое'},
+            content_type='application/json',
+            **self.auth
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertSubscriptionsCount()
+        self.assertEqual(self.reader.first_name, 'Новое')
+
+    def test_patch_recipe(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        Favorite.objects.create(user=self.reader, recipe=recipe)
+        ShoppingCart.objects.create(user=self.reader, recipe=recipe)
+        serializer = WriteRecipeSerialiser(
+            recipe, data={'name': 'Новое'}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, 'Новое')
+        self.assertEqual(
+            (
+                recipe.favorites_count,
+                recipe.shopping_carts_count,
+                recipe.popularity,
+            ),
+            (1, 1, 3)
+        )
+
+
+class TagsFilterTest(TestCase):
+    """Тег, удаленный из каталога после проверки выбора, не дает 500."""
+
+    def setUp(self):
+        caches['default'].clear()
+        caches['versions'].clear()
+
+    def test_unknown_slug(self):
+        author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='password',
+            first_name='Имя',
+            last_name='Фамилия',
+        )
+        tag = Tag.objects.create(name='Тег', slug='tag')
+        recipe = Recipe.objects.create(
+            author=author,
+            name='Рецепт',
+            image='recipes_images/recipe.png',
+            text='Описание',
+            cooking_time=10,
+        )
+        recipe.tags.set([tag])
+        for tags_match, expected in (
+            (TAGS_MATCH_ANY, [recipe]),
+            (TAGS_MATCH_ALL, []),
+        ):
+            with self.subTest(tags_match=tags_match):
+                recipes = RecipesFilter(
+                    {'tags': ['tag'], 'tags_match': tags_match},
+                    queryset=Recipe.objects.all(),
+                )
+                self.assertTrue(recipes.form.is_valid())
+                self.assertEqual(
+                    list(recipes.get_tags(
+                        Recipe.objects.all(), 'tags', ['tag', 'deleted'])),
+                    expected
+                )
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Планы запросов PostgreSQL.')
+class QueryPlansTest(TestCase):
+    """
+    Запросы ленты Рецептов со всеми сочетаниями фильтров используют
+    индексы (команда check_query_plans). Планировщик выбирает индексы
+    по статистике, поэтому данных - как в рабочей базе, и после их
+    создания собирается статистика.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        rows = Random(0)
+        users = User.objects.bulk_create(
+            User(
+                username=f'user{number}',
+                email=f'user{number}@example.com',
+                first_name='Имя',
+                last_name='Фамилия',
+            )
+            for number in range(PLANS_USERS_NUMBER)
+        )
+        tags = Tag.objects.bulk_create(
+            Tag(name=f'Тег {number}', slug=f'tag{number}')
+            for number in range(PLANS_TAGS_NUMBER)
+        )
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=users[number % len(users)],
+                name=f'Рецепт {number}',
+                image='recipes_images/recipe.png',
+                text='Описание',
+                cooking_time=rows.randint(1, 120),
+            )
+            for number in range(PLANS_RECIPES_NUMBER)
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tag)
+            for recipe in recipes
+            for tag in rows.sample(tags, 2)
+        )
+        for model, number in (
+            (Favorite, PLANS_FAVORITES_NUMBER),
+            (ShoppingCart, PLANS_SHOPPING_CARTS_NUMBER),
+        ):
+            model.objects.bulk_create(
+                model(user=user, recipe=recipe)
+                for user in users
+                for recipe in rows.sample(recipes, number)
+            )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test_plans_use_indexes(self):
+        output = StringIO()
+        try:
+            call_command('check_query_plans', stdout=output)
+        except CommandError:
+            self.fail(output.getvalue())
@@ -2,6 +2,7 @@ from django.urls import include, path
 from rest_framework import routers
 
 from . import views
+from config.async_views import as_async_urls
 
 
 app_name = 'api'
@@ -13,8 +14,18 @@ router.register('ingredients', views.IngredientViewSet,
                 basename='ingredients')
 router.register('recipes', views.RecipesViewSet, basename='recipes')
 
+ASYNC_ROUTES = (
+    'recipes-list',
+    'recipes-detail',
+    'recipes-feed',
+    'tags-list',
+    'tags-detail',
+    'ingredients-list',
+    'ingredients-detail',
+)
+
 
 urlpatterns = [
-    path('', include(router.urls)),
+    path('', include(as_async_urls(router.urls, ASYNC_ROUTES))),
     path('auth/', include('djoser.urls.authtoken')),
 ]
@@ -1,5 +1,11 @@
+import csv
+import json
 from datetime import datetime
 
+from django.db.models import F, Value
+
+from recipes.models import Recipe, ShoppingCartTotal
+
 
 REPORT_TITLE = 'СПИСОК ПОКУПОК'
 CREATED_DATE = 'составлен {:%d.%m.%Y}'
@@ -8,17 +14,158 @@ INGREDIENT_FORMAT = '{} ({}): {}'
 LINE_FORMAT = '  {}. {}'
 RECIPES_TITLE = '\nДля приготовления:'
 RECIPE_FORMAT = '  - {}'
+CSV_HEADER = ('Раздел', 'Название', 'Единица измерения', 'Количество')
+CSV_INGREDIENT = 'Продукт'
+CSV_RECIPE = 'Рецепт'
+ITERATOR_CHUNK_SIZE = 500
+
+INGREDIENT_ROW = 0
+RECIPE_ROW = 1
+
+
+def get_shopping_cart_rows(user):
+    """
+    Строки списка покупок одним запросом: сначала готовые итоги
+    по Продуктам, затем названия Рецептов. Строки читаются курсором
+    по мере отправки.
+    """
+    ingredients = ShoppingCartTotal.objects.filter(user=user).annotate(
+        total_amount=F('amount'), row_type=Value(INGREDIENT_ROW),
+    ).values_list(
+        'ingredient__name', 'ingredient__measurement_unit', 'total_amount',
+        'row_type',
+    )
+    recipes = Recipe.objects.filter(shoppingcarts__user=user).order_by(
+    ).annotate(
+        measurement_unit=Value(''),
+        total_amount=Value(0),
+        row_type=Value(RECIPE_ROW),
+    ).values_list('name', 'measurement_unit', 'total_amount', 'row_type')
+    return ingredients.union(recipes, all=True).order_by(
+        'row_type', 'ingredient__name'
+    ).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+
+
+class ShoppingCartRenderer:
+    """
+    Базовый формат списка покупок: отчет выдается частями по мере
+    чтения строк запроса.
+    """
+
+    extension = None
+    content_type = None
+
+    def render(self, rows):
+        yield from self.render_header()
+        ingredients_number = recipes_number = 0
+        for name, measurement_unit, amount, row_type in rows:
+            if row_type == INGREDIENT_ROW:
+                ingredients_number += 1
+                yield from self.render_ingredient(
+                    ingredients_number, name, measurement_unit, amount)
+                continue
+            if not recipes_number:
+                yield from self.render_recipes_header()
+            recipes_number += 1
+            yield from self.render_recipe(recipes_number, name)
+        if not recipes_number:
+            yield from self.render_recipes_header()
+        yield from self.render_footer()
+
+    def render_header(self):
+        return ()
+
+    def render_ingredient(self, number, name, measurement_unit, amount):
+        raise NotImplementedError
+
+    def render_recipes_header(self):
+        return ()
+
+    def render_recipe(self, number, name):
+        raise NotImplementedError
+
+    def render_footer(self):
+        return ()
+
+
+class TextShoppingCartRenderer(ShoppingCartRenderer):
+    extension = 'txt'
+    content_type = 'text/plain; charset=utf-8'
+
+    def render_header(self):
+        yield f'{REPORT_TITLE}\n'
+        yield f'{CREATED_DATE.format(datetime.now())}\n'
+        yield f'{INGREDIENTS_TITLE}\n'
+
+    def render_ingredient(self, number, name, measurement_unit, amount):
+        yield LINE_FORMAT.format(number, INGREDIENT_FORMAT.format(
+            name, measurement_unit, amount).capitalize()) + '\n'
+
+    def render_recipes_header(self):
+        yield f'{RECIPES_TITLE}\n'
+
+    def render_recipe(self, number, name):
+        yield RECIPE_FORMAT.format(name) + '\n'
+
+
+class EchoBuffer:
+    """Буфер, возвращающий записанное значение, для потоковой записи CSV."""
+
+    def write(self, value):
+        return value
+
+
+class CsvShoppingCartRenderer(ShoppingCartRenderer):
+    extension = 'csv'
+    content_type = 'text/csv; charset=utf-8'
+
+    def __init__(self):
+        self.writer = csv.writer(EchoBuffer())
+
+    def render_header(self):
+        yield self.writer.writerow(CSV_HEADER)
+
+    def render_ingredient(self, number, name, measurement_unit, amount):
+        yield self.writer.writerow(
+            (CSV_INGREDIENT, name, measurement_unit, amount))
+
+    def render_recipe(self, number, name):
+        yield self.writer.writerow((CSV_RECIPE, name, '', ''))
+
+
+class JsonShoppingCartRenderer(ShoppingCartRenderer):
+    extension = 'json'
+    content_type = 'application/json'
+
+    def render_header(self):
+        yield '{"ingredients": ['
+
+    def render_ingredient(self, number, name, measurement_unit, amount):
+        yield (',' if number > 1 else '') + self.dumps({
+            'name': name,
+            'measurement_unit': measurement_unit,
+            'amount': amount,
+        })
+
+    def render_recipes_header(self):
+        yield '], "recipes": ['
+
+    def render_recipe(self, number, name):
+        yield (',' if number > 1 else '') + self.dumps(name)
+
+    def render_footer(self):
+        yield ']}'
+
+    @staticmethod
+    def dumps(value):
+        return json.dumps(value, ensure_ascii=False)
 
 
-def render_shopping_cart(recipes, ingredients):
-    return '\n'.join([
-        REPORT_TITLE,
-        CREATED_DATE.format(datetime.now()),
-        INGREDIENTS_TITLE,
-        *[LINE_FORMAT.format(
-            number,
-            INGREDIENT_FORMAT.format(*ingredient).capitalize()
-        ) for number, ingredient in enumerate(ingredients, 1)],
-        RECIPES_TITLE,
-        *[RECIPE_FORMAT.format(recipe.name) for recipe in recipes]
-    ])
+SHOPPING_CART_RENDERERS = {
+    renderer.extension: renderer
+    for renderer in (
+        TextShoppingCartRenderer,
+        CsvShoppingCartRenderer,
+        JsonShoppingCartRenderer,
+    )
+}
@@ -1,15 +1,41 @@
 from django_filters.rest_framework import DjangoFilterBackend
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import FileResponse
+from django.db import transaction
+from django.db.models import (Exists, F, OuterRef, Prefetch, Value, Window,
+                              prefetch_related_objects)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet as BaseUserViewSet
 from rest_framework import (decorators, permissions, response, serializers,
                             status, viewsets,)
 from rest_framework.reverse import reverse
 
-from .filters import IngredientFilter, RecipesFilter
-from .pagination import PageNumberPaginationWithLimit
+from recipes.catalog import get_catalog
+from recipes.feeds import get_feed
+from recipes.short_links import encode, recipe_exists
+from recipes.versions import (
+    AUTHORS_VERSION_KEY,
+    RECIPES_LIST_VERSION_KEY,
+    get_user_state_version,
+    get_version,
+)
+from recipes.models import (
+    Favorite,
+    Recipe,
+    ShoppingCart,
+    Subscription,
+)
+
+from .conditional import NANOSECONDS, ConditionalResponseMixin
+from .filters import RecipesFilter
+from .negotiation import IgnoreFormatContentNegotiation
+from .pagination import (
+    KeysetPagination,
+    RecipesPagination,
+    UsersPagination,
+)
 from .permissions import IsAuthorOrReadOnly
 from .serializers import (
     AvatarSerializer,
@@ -20,16 +46,7 @@ from .serializers import (
     UserInSubscriptionsSerializer,
     WriteRecipeSerialiser,
 )
-from .utils import render_shopping_cart
-from recipes.models import (
-    Favorite,
-    Ingredient,
-    Recipe,
-    RecipeIngridients,
-    ShoppingCart,
-    Subscription,
-    Tag,
-)
+from .utils import SHOPPING_CART_RENDERERS, get_shopping_cart_rows
 
 
 User = get_user_model()
@@ -38,10 +55,24 @@ SELF_SUBSCRIPTION_MESSAGE = 'Нельзя быть подписанным на 
 NOT_UNUNIQUE_SUBSCRIPTION_MESSAGE = 'Вы уже подписаны на данного автора.'
 NOT_UNUNIQUE_MESSAGE = 'Попытка создать дублирующуюся запись в модели {model}.'
 RECIPE_NOT_EXIST_MESSAGE = 'Рецепт с id={id} не найден.'
+UNKNOWN_FORMAT_MESSAGE = 'Неизвестный формат {format}, доступны: {formats}.'
+RECIPES_LIMIT_MESSAGE = 'Укажите целое число от 0 до {limit}.'
+RECIPES_LIMIT_DEFAULT = 10
+RECIPES_LIMIT = 100
+INGREDIENTS_SEARCH_LIMIT = 50
+SHOPPING_CART_DISPOSITION = 'attachment; filename="shopping-list.{}"'
 
 
 class UserViewSet(BaseUserViewSet):
-    pagination_class = PageNumberPaginationWithLimit
+    pagination_class = UsersPagination
+
+    def get_queryset(self):
+        user = self.request.user
+        return super().get_queryset().annotate(
+            is_subscribed=Exists(Subscription.objects.filter(
+                user=user, author=OuterRef('pk')))
+            if user.is_authenticated else Value(False)
+        )
 
     def get_permissions(self):
         if self.action == 'me':
@@ -66,7 +97,6 @@ class UserViewSet(BaseUserViewSet):
             serializer.is_valid(raise_exception=True)
             serializer.save()
             return response.Response(serializer.data)
-        instance.avatar.delete()
         instance.avatar = None
         instance.save()
         return response.Response(status=status.HTTP_204_NO_CONTENT)
@@ -76,6 +106,7 @@ class UserViewSet(BaseUserViewSet):
         detail=True,
         url_name='subscribe',
     )
+    @transaction.atomic
     def subscribe(self, request, id=None):
         user = request.user
         author = get_object_or_404(User, pk=id)
@@ -84,71 +115,233 @@ class UserViewSet(BaseUserViewSet):
             return response.Response(status=status.HTTP_204_NO_CONTENT)
         if user == author:
             raise serializers.ValidationError(SELF_SUBSCRIPTION_MESSAGE)
+        recipes_limit = self.get_recipes_limit()
         _, is_created = Subscription.objects.get_or_create(
             user=user, author=author)
         if not is_created:
             raise serializers.ValidationError(
                 NOT_UNUNIQUE_MESSAGE.format(model=Subscription))
         return response.Response(
-            self.get_serializer(author).data,
+            self.get_serializer(self.prefetch_recipes(
+                [self.annotate_authors(
+                    User.objects.filter(pk=author.pk)).get()],
+                recipes_limit
+            )[0]).data,
             status=status.HTTP_201_CREATED
         )
 
     @decorators.action(detail=False, url_name='subscribtions')
     def subscriptions(self, request):
+        recipes_limit = self.get_recipes_limit()
         return self.get_paginated_response(
             self.get_serializer(
-                self.paginate_queryset(
-                    User.objects.filter(authors__user=request.user)
+                self.prefetch_recipes(
+                    self.paginate_queryset(self.annotate_authors(
+                        User.objects.filter(authors__user=request.user))),
+                    recipes_limit
                 ),
                 many=True
             ).data
         )
 
+    def annotate_authors(self, authors):
+        """Авторы для Подписок: число рецептов хранится в счетчике автора."""
+        return authors.annotate(
+            is_subscribed=Value(True),
+        ).order_by('username')
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
-    """Вьюсет для модели Тега, обеспечивающий только чтение данных."""
+    def get_recipes_limit(self):
+        recipes_limit = self.request.query_params.get(
+            'recipes_limit', str(RECIPES_LIMIT_DEFAULT))
+        if not recipes_limit.isdigit() or int(recipes_limit) > RECIPES_LIMIT:
+            raise serializers.ValidationError(
+                {'recipes_limit': RECIPES_LIMIT_MESSAGE.format(
+                    limit=RECIPES_LIMIT)})
+        return int(recipes_limit)
+
+    @staticmethod
+    def prefetch_recipes(authors, recipes_limit):
+        """
+        Первые recipes_limit рецептов авторов страницы - одним запросом:
+        ROW_NUMBER() OVER (PARTITION BY author_id) нумерует рецепты
+        каждого автора в порядке ленты. Django 3.2 не фильтрует
+        по оконным функциям, поэтому нумерация - в подзапросе RawSQL.
+        """
+        if not authors:
+            return authors
+        numbered = Recipe.objects.filter(author__in=authors).annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=[F('author')],
+                order_by=[F('pub_date').desc(), F('name').asc()],
+            )
+        ).order_by().values('pk', 'row_number')
+        sql, params = numbered.query.sql_with_params()
+        prefetch_related_objects(authors, Prefetch(
+            'recipes',
+            queryset=Recipe.objects.filter(pk__in=RawSQL(
+                f'SELECT "id" FROM ({sql}) AS "numbered" '
+                'WHERE "row_number" <= %s',
+                (*params, recipes_limit)
+            )),
+            to_attr='limited_recipes'
+        ))
+        return authors
+
+
+class CatalogViewSet(ConditionalResponseMixin,
+                     viewsets.ReadOnlyModelViewSet):
+    """
+    Базовый вьюсет для Тегов и Продуктов: данные читаются
+    из каталога в памяти процесса без запросов к БД.
+    """
 
-    queryset = Tag.objects.all()
-    serializer_class = TagSerializer
     pagination_class = None
+    filter_backends = ()
     permission_classes = (permissions.AllowAny,)
 
+    def get_catalog_items(self, catalog):
+        raise NotImplementedError
+
+    def get_catalog_items_by_id(self, catalog):
+        raise NotImplementedError
+
+    def get_queryset(self):
+        return self.get_catalog_items(get_catalog())
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
-    """Вьюсет для модели Продукта, обеспечивающий чтение данных."""
+    def get_object(self):
+        pk = self.kwargs['pk']
+        item = self.get_catalog_items_by_id(get_catalog()).get(
+            int(pk) if pk.isdigit() else None)
+        if item is None:
+            raise Http404
+        return item
+
+    def get_validators(self):
+        version = get_catalog().version
+        return None if version is None else ((version,), version)
+
+
+class TagViewSet(CatalogViewSet):
+    """Вьюсет для модели Тега, обеспечивающий только чтение данных."""
+
+    serializer_class = TagSerializer
+
+    def get_catalog_items(self, catalog):
+        return catalog.tags
+
+    def get_catalog_items_by_id(self, catalog):
+        return catalog.tags_by_id
+
+
+class IngredientViewSet(CatalogViewSet):
+    """
+    Вьюсет для модели Продукта, обеспечивающий чтение данных.
+    При поиске по названию (name) отдается не больше limit продуктов.
+    """
 
-    queryset = Ingredient.objects.all()
     serializer_class = IngredientSerialiser
-    pagination_class = None
-    filter_backends = (DjangoFilterBackend,)
-    filterset_class = IngredientFilter
-    permission_classes = (permissions.AllowAny,)
 
+    def get_catalog_items(self, catalog):
+        name = self.request.query_params.get('name')
+        if name is None:
+            return catalog.ingredients
+        limit = self.request.query_params.get('limit', '')
+        return catalog.search(
+            name, int(limit) if limit.isdigit() else INGREDIENTS_SEARCH_LIMIT)
+
+    def get_catalog_items_by_id(self, catalog):
+        return catalog.ingredients_by_id
 
-class RecipesViewSet(viewsets.ModelViewSet):
+
+class RecipesViewSet(ConditionalResponseMixin, viewsets.ModelViewSet):
     """
     Вьюсет для модели Рецептов, обеспечивает:
     - операции CRUD для рецептов;
     - получение ссылки на рецепт;
     - добавление и удаление рецепта в Избранное, Список покупок;
-    - получение списка покупок в формате .txt.
+    - получение списка покупок в форматах .txt, .csv, .json;
+    - ленту рецептов авторов из подписок.
     """
 
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipesFilter
-    pagination_class = PageNumberPaginationWithLimit
+    pagination_class = RecipesPagination
+
+    def get_queryset(self):
+        if self.action in ('list', 'retrieve', 'feed'):
+            return Recipe.objects.for_reading(self.request.user)
+        return super().get_queryset()
 
     def get_serializer_class(self):
-        if self.action in ('list', 'retrieve'):
+        if self.action in ('list', 'retrieve', 'feed'):
             return ReadRecipeSerialiser
         return WriteRecipeSerialiser
 
+    def get_validators(self):
+        """
+        Состав и число рецептов списка меняются вместе с версией списка
+        Рецептов, содержимое и порядок страницы - с ее рецептами и их
+        updated_at: читаются только id и updated_at рецептов страницы.
+        Признаки пользователя, Продукты и авторы меняются вместе с их
+        версиями. Для пагинации по ключу валидаторы не считаются.
+        """
+        recipes = Recipe.objects.all()
+        versions = [get_catalog().version, get_version(AUTHORS_VERSION_KEY)]
+        if self.action == 'list':
+            if 'cursor' in self.request.query_params:
+                return None
+            page = self.request.query_params.get(
+                self.paginator.page_query_param, '1')
+            if not page.isdigit() or int(page) < 1:
+                return None
+            size = self.paginator.get_page_size(self.request)
+            start = (int(page) - 1) * size
+            recipes = self.filter_queryset(recipes)[start:start + size]
+            versions.append(get_version(RECIPES_LIST_VERSION_KEY))
+        elif self.kwargs['pk'].isdigit():
+            recipes = recipes.filter(pk=self.kwargs['pk'])
+        else:
+            return None
+        rows = tuple(recipes.values_list('pk', 'updated_at'))
+        user = self.request.user
+        if user.is_authenticated:
+            versions.append(get_user_state_version(user.pk))
+        if not rows or None in versions:
+            return None
+        return (
+            (user.pk, rows, *versions),
+            max(
+                *(int(updated_at.timestamp()) * NANOSECONDS
+                  for pk, updated_at in rows),
+                *versions
+            )
+        )
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @decorators.action(
+        detail=False,
+        permission_classes=(permissions.IsAuthenticated,),
+        pagination_class=KeysetPagination,
+        url_name='feed',
+    )
+    def feed(self, request):
+        """
+        Рецепты авторов из подписок, новые первыми. Страница выбирается
+        по ключу (get_feed), затем Рецепты загружаются для чтения.
+        """
+        user = request.user
+        keys = self.paginator.paginate_keys(
+            lambda position, limit: get_feed(user, position, limit), request)
+        recipes = self.get_queryset().in_bulk([pk for _, pk in keys])
+        return self.paginator.get_paginated_response(self.get_serializer(
+            [recipes[pk] for _, pk in keys if pk in recipes], many=True
+        ).data)
+
     @decorators.action(
         detail=True,
         permission_classes=(permissions.AllowAny,),
@@ -156,11 +349,11 @@ class RecipesViewSet(viewsets.ModelViewSet):
         url_name='get_link',
     )
     def get_link(self, request, pk=None):
-        if not Recipe.objects.filter(pk=pk).exists():
+        if not pk.isdigit() or not recipe_exists(int(pk)):
             raise serializers.ValidationError(
                 RECIPE_NOT_EXIST_MESSAGE.format(id=pk))
         return response.Response({'short-link': request.build_absolute_uri(
-            reverse('recipes:short-link', args=[pk])
+            reverse('recipes:short-link', args=[encode(pk)])
         )})
 
     @decorators.action(
@@ -190,24 +383,26 @@ class RecipesViewSet(viewsets.ModelViewSet):
     @decorators.action(
         detail=False,
         permission_classes=(permissions.IsAuthenticated,),
+        content_negotiation_class=IgnoreFormatContentNegotiation,
         url_name='download_shopping_cart'
     )
     def download_shopping_cart(self, request):
-        user = request.user
-        recipes = Recipe.objects.filter(
-            shoppingcarts__user=user
-        ).order_by('name')
-        ingredients = RecipeIngridients.objects.filter(
-            recipe__shoppingcarts__user=user
-        ).values_list(
-            'ingredient__name', 'ingredient__measurement_unit',
-        ).annotate(total_amount=Sum('amount')).order_by('ingredient__name')
-        return FileResponse(
-            render_shopping_cart(recipes, ingredients),
-            as_attachment=True,
-            filename='shopping-list.txt'
+        file_format = request.query_params.get('format', 'txt')
+        if file_format not in SHOPPING_CART_RENDERERS:
+            raise serializers.ValidationError(UNKNOWN_FORMAT_MESSAGE.format(
+                format=file_format,
+                formats=', '.join(SHOPPING_CART_RENDERERS)
+            ))
+        renderer = SHOPPING_CART_RENDERERS[file_format]()
+        shopping_cart = StreamingHttpResponse(
+            renderer.render(get_shopping_cart_rows(request.user)),
+            content_type=renderer.content_type,
         )
+        shopping_cart['Content-Disposition'] = (
+            SHOPPING_CART_DISPOSITION.format(renderer.extension))
+        return shopping_cart
 
+    @transaction.atomic
     def add_to_user_chosen(self, model, user):
         recipe = self.get_object()
         _, is_created = model.objects.get_or_create(user=user, recipe=recipe)
@@ -219,6 +414,7 @@ class RecipesViewSet(viewsets.ModelViewSet):
             status=status.HTTP_201_CREATED
         )
 
+    @transaction.atomic
     def delete_from_user_chosen(self, user_chosen_recipes, pk=None):
         get_object_or_404(user_chosen_recipes, recipe=pk).delete()
         return response.Response(status=status.HTTP_204_NO_CONTENT)
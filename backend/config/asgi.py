@@ -9,8 +9,12 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+
+from config.async_views import ASGIHandler  # noqa: E402
+
+application = ASGIHandler()
@@ -0,0 +1,111 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler as BaseASGIHandler
+from django.db import close_old_connections
+from django.urls import URLPattern
+
+
+def run_view(view, request, *args, **kwargs):
+    """
+    Синхронное представление целиком в потоке пула: ответ DRF
+    рендерится здесь же, соединение потока закрывается по правилам
+    CONN_MAX_AGE, как после обычного запроса.
+    """
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render') and not response.is_rendered:
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def as_async_view(view):
+    """
+    Асинхронная обертка синхронного представления для ASGI.
+    Без нее Django выполняет синхронные представления в одном общем
+    потоке (thread_sensitive), то есть по одному запросу на процесс;
+    обертка отдает их пулу потоков, и запросы к БД идут параллельно.
+    Атрибуты представления (cls, actions, csrf_exempt) сохраняются.
+    """
+
+    @wraps(view)
+    async def async_view(request, *args, **kwargs):
+        return await sync_to_async(run_view, thread_sensitive=False)(
+            view, request, *args, **kwargs)
+
+    return async_view
+
+
+def as_async_urls(patterns, names):
+    """
+    Маршруты с именами из names с асинхронными представлениями,
+    если включен ASYNC_VIEWS (режим ASGI); иначе маршруты без изменений.
+    """
+    if not settings.ASYNC_VIEWS:
+        return patterns
+    return [
+        URLPattern(
+            pattern.pattern,
+            as_async_view(pattern.callback),
+            pattern.default_args,
+            pattern.name,
+        )
+        if isinstance(pattern, URLPattern) and pattern.name in names
+        else pattern
+        for pattern in patterns
+    ]
+
+
+class ASGIHandler(BaseASGIHandler):
+    """
+    Обработчик ASGI, который читает потоковые ответы (список покупок)
+    в отдельном потоке. Django 3.2 обходит их синхронно прямо в цикле
+    событий: запросы к БД там запрещены, а долгая выгрузка остановила
+    бы все остальные соединения процесса.
+    """
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+        headers = [
+            (
+                header.encode('ascii') if isinstance(header, str) else header,
+                value.encode('latin1') if isinstance(value, str) else value,
+            )
+            for header, value in response.items()
+        ]
+        headers.extend(
+            (b'Set-Cookie', cookie.output(header='').encode('ascii').strip())
+            for cookie in response.cookies.values()
+        )
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': headers,
+        })
+        # Один поток на ответ: курсор БД генератора привязан к потоку.
+        loop = asyncio.get_running_loop()
+        end = object()
+        parts = iter(response)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            try:
+                while True:
+                    part = await loop.run_in_executor(
+                        executor, next, parts, end)
+                    if part is end:
+                        break
+                    for chunk, _ in self.chunk_bytes(part):
+                        await send({
+                            'type': 'http.response.body',
+                            'body': chunk,
+                            'more_body': True,
+                        })
+                await send({'type': 'http.response.body'})
+            finally:
+                # request_finished закроет соединение этого же потока.
+                await loop.run_in_executor(executor, response.close)
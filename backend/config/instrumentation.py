@@ -0,0 +1,245 @@
+import logging
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from random import random
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+logger = logging.getLogger(__name__)
+
+SLOW_REQUEST = ('Медленный запрос {method} {path}: ответ {status}, '
+                '{total:.0f} мс, SQL-запросов {queries} за {db:.0f} мс, '
+                'сериализация {serialization:.0f} мс.')
+REPEATED_SQL = '\n  {count} x {fingerprint}'
+REPEATED_SQL_LIMIT = 5
+SQL_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+_request_stats = ContextVar('request_stats', default=None)
+_query_observers = ContextVar('query_observers', default=())
+
+
+def get_fingerprint(sql):
+    """SQL без значений: запросы, отличающиеся только ими, совпадают."""
+    return SQL_LITERALS.sub('?', SQL_IN_LIST.sub('IN (...)', sql))
+
+
+def observe_queries(execute, sql, params, many, context):
+    """
+    Обертка всех соединений: передает SQL-запрос и его время
+    наблюдателям текущего контекста. Наблюдатели хранятся в ContextVar,
+    а не в соединении: при ASGI представление выполняется в другом
+    потоке со своим соединением, а контекст переходит туда вместе с ним.
+    """
+    observers = _query_observers.get()
+    if not observers:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = perf_counter() - started
+        for observer in observers:
+            observer(sql, duration)
+
+
+@receiver(connection_created)
+def install_query_observer(sender, connection, **kwargs):
+    if observe_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(observe_queries)
+
+
+# Соединения этого потока, открытые до загрузки middleware.
+for connection in connections.all():
+    install_query_observer(None, connection)
+
+
+@contextmanager
+def observe(observer):
+    """Вызывать observer(sql, duration) для SQL-запросов внутри блока."""
+    token = _query_observers.set((*_query_observers.get(), observer))
+    try:
+        yield
+    finally:
+        _query_observers.reset(token)
+
+
+class ObservingMiddleware:
+    """
+    Базовый middleware замеров для WSGI и ASGI. При асинхронной цепочке
+    обработка остается в цикле событий, а не уходит в общий поток
+    синхронного кода, который выполнял бы запросы по одному.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def start(self, request):
+        """Данные замера запроса (с методом observe) или None."""
+        raise NotImplementedError
+
+    def finish(self, request, response, state):
+        raise NotImplementedError
+
+    def observing(self, state):
+        return observe(state.observe)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.acall(request)
+        state = self.start(request)
+        if state is None:
+            return self.get_response(request)
+        with self.observing(state):
+            response = self.get_response(request)
+        return self.respond(request, response, state)
+
+    async def acall(self, request):
+        state = self.start(request)
+        if state is None:
+            return await self.get_response(request)
+        with self.observing(state):
+            response = await self.get_response(request)
+        return self.respond(request, response, state)
+
+    def respond(self, request, response, state):
+        """
+        Тело потокового ответа формируется уже после выхода
+        из middleware: его запросы наблюдаются при чтении каждой части,
+        а замер завершается в конце потока.
+        """
+        if not response.streaming:
+            return self.finish(request, response, state)
+        response.streaming_content = self.observe_stream(
+            response.streaming_content, request, response, state)
+        return response
+
+    def observe_stream(self, parts, request, response, state):
+        parts = iter(parts)
+        try:
+            while True:
+                with self.observing(state):
+                    part = next(parts, None)
+                if part is None:
+                    return
+                yield part
+        finally:
+            self.finish(request, response, state)
+
+
+class RequestStats:
+    """Статистика одного запроса: SQL-запросы, время в БД и сериализации."""
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.queries = 0
+        self.db_time = 0
+        self.serialization_time = 0
+        self.serializing = False
+        self.sql = Counter()
+
+    def observe(self, sql, duration):
+        self.db_time += duration
+        self.queries += 1
+        self.sql[sql] += 1
+
+    def get_repeated_sql(self):
+        """Повторяющиеся запросы (признак N+1), самые частые первыми."""
+        fingerprints = Counter()
+        for sql, count in self.sql.items():
+            fingerprints[get_fingerprint(sql)] += count
+        return [
+            (fingerprint, count)
+            for fingerprint, count in fingerprints.most_common(
+                REPEATED_SQL_LIMIT)
+            if count > 1
+        ]
+
+
+class InstrumentationMiddleware(ObservingMiddleware):
+    """
+    Замеры для доли запросов INSTRUMENTATION_SAMPLE_RATE: число и время
+    SQL-запросов, время сериализации и общее время ответа. Результаты
+    отдаются в заголовке Server-Timing (кроме потоковых ответов:
+    заголовки уходят раньше тела); запросы медленнее
+    SLOW_REQUEST_MS или с числом SQL-запросов от SLOW_REQUEST_QUERIES
+    попадают в лог вместе с повторяющимися SQL-запросами.
+    """
+
+    def start(self, request):
+        if random() >= settings.INSTRUMENTATION_SAMPLE_RATE:
+            return None
+        return RequestStats()
+
+    @contextmanager
+    def observing(self, stats):
+        token = _request_stats.set(stats)
+        try:
+            with observe(stats.observe):
+                yield
+        finally:
+            _request_stats.reset(token)
+
+    def finish(self, request, response, stats):
+        total = perf_counter() - stats.started
+        if settings.SERVER_TIMING and not response.streaming:
+            response['Server-Timing'] = ', '.join((
+                f'db;dur={stats.db_time * 1000:.1f};'
+                f'desc="{stats.queries} queries"',
+                f'serialize;dur={stats.serialization_time * 1000:.1f}',
+                f'view;dur={(total - stats.serialization_time) * 1000:.1f}',
+                f'total;dur={total * 1000:.1f}',
+            ))
+        if (
+            total * 1000 >= settings.SLOW_REQUEST_MS
+            or stats.queries >= settings.SLOW_REQUEST_QUERIES
+        ):
+            logger.warning(
+                SLOW_REQUEST.format(
+                    method=request.method,
+                    path=request.get_full_path(),
+                    status=response.status_code,
+                    total=total * 1000,
+                    queries=stats.queries,
+                    db=stats.db_time * 1000,
+                    serialization=stats.serialization_time * 1000,
+                ) + ''.join(
+                    REPEATED_SQL.format(count=count, fingerprint=fingerprint)
+                    for fingerprint, count in stats.get_repeated_sql()
+                )
+            )
+        return response
+
+
+class TimedSerializerMixin:
+    """
+    Время to_representation сериализатора учитывается в статистике
+    запроса отдельно от работы представления. Вложенные вызовы
+    не учитываются повторно.
+    """
+
+    def to_representation(self, instance):
+        stats = _request_stats.get()
+        if stats is None or stats.serializing:
+            return super().to_representation(instance)
+        stats.serializing = True
+        started = perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            stats.serialization_time += perf_counter() - started
+            stats.serializing = False
@@ -0,0 +1,318 @@
+import atexit
+import json
+import os
+from threading import Lock
+from time import monotonic, perf_counter
+
+from django.conf import settings
+from django.http import HttpResponse
+
+from .instrumentation import ObservingMiddleware
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+UNKNOWN_VIEW = 'unknown'
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+SIZE_BUCKETS = tuple(256 * 4 ** power for power in range(9))
+QUERIES_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+# Сумма значений завершившихся процессов.
+EXITED_FILE = 'exited.json'
+
+
+def format_labels(names, values, extra=''):
+    labels = [
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n')
+        )
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        labels.append(extra)
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+class Metric:
+    """Метрика с метками: значения хранятся по кортежу значений меток."""
+
+    type = None
+
+    def __init__(self, name, documentation, labels):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.values = {}
+
+    def merge(self, values, other):
+        raise NotImplementedError
+
+    def expose(self, values):
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def merge(self, values, other):
+        for labels, value in other.items():
+            values[labels] = values.get(labels, 0) + value
+
+    def expose(self, values):
+        for labels, value in sorted(values.items()):
+            yield f'{self.name}{format_labels(self.labels, labels)} {value}'
+
+
+class Histogram(Metric):
+    """
+    Гистограмма: число наблюдений по корзинам (не накопительно),
+    сумма и число наблюдений.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels, buckets):
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+
+    def observe(self, labels, value):
+        state = self.values.get(labels)
+        if state is None:
+            state = self.values[labels] = [0] * (len(self.buckets) + 3)
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            index = len(self.buckets)
+        state[index] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    def merge(self, values, other):
+        for labels, state in other.items():
+            if labels in values:
+                values[labels] = [
+                    own + added for own, added in zip(values[labels], state)
+                ]
+            else:
+                values[labels] = list(state)
+
+    def expose(self, values):
+        for labels, state in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), state):
+                cumulative += count
+                yield '{}_bucket{} {}'.format(
+                    self.name,
+                    format_labels(self.labels, labels, f'le="{bound}"'),
+                    cumulative
+                )
+            label_text = format_labels(self.labels, labels)
+            yield f'{self.name}_sum{label_text} {state[-2]}'
+            yield f'{self.name}_count{label_text} {state[-1]}'
+
+
+class Registry:
+    """
+    Метрики процесса. Если задан METRICS_DIR, каждый процесс
+    (воркер gunicorn) не чаще раза в METRICS_FLUSH_INTERVAL секунд
+    сохраняет свои значения в собственный файл, а /metrics суммирует
+    файлы всех процессов. Мастер gunicorn очищает каталог при запуске
+    и переносит значения завершившихся воркеров в общий файл
+    (см. gunicorn.conf.py): файлы по PID не копятся, а счетчики
+    не уменьшаются при перезапуске воркеров.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = Lock()
+        self.flushed = monotonic()
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def get_path(self):
+        return os.path.join(settings.METRICS_DIR, f'{os.getpid()}.json')
+
+    @staticmethod
+    def dump(values):
+        return json.dumps({
+            name: [[list(labels), value] for labels, value in items.items()]
+            for name, items in values.items()
+        })
+
+    @staticmethod
+    def write(path, data):
+        with open(f'{path}.tmp', 'w', encoding='utf-8') as file:
+            file.write(data)
+        os.replace(f'{path}.tmp', path)
+
+    def flush(self, force=False):
+        # Процесс без значений (например, мастер gunicorn) файла
+        # не пишет.
+        if not any(metric.values for metric in self.metrics.values()):
+            return
+        if not settings.METRICS_DIR:
+            return
+        now = monotonic()
+        if not force and now - self.flushed < settings.METRICS_FLUSH_INTERVAL:
+            return
+        self.flushed = now
+        with self.lock:
+            data = self.dump({
+                name: metric.values for name, metric in self.metrics.items()
+            })
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        self.write(self.get_path(), data)
+
+    def merge_file(self, values, path):
+        """Добавляет к values значения из файла процесса."""
+        try:
+            with open(path, encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return
+        for name, items in data.items():
+            if name in self.metrics:
+                self.metrics[name].merge(values.setdefault(name, {}), {
+                    tuple(labels): value for labels, value in items
+                })
+
+    def collect(self):
+        """Значения метрик, сложенные по всем процессам."""
+        if not settings.METRICS_DIR:
+            with self.lock:
+                return {
+                    name: dict(metric.values)
+                    for name, metric in self.metrics.items()
+                }
+        self.flush(force=True)
+        values = {name: {} for name in self.metrics}
+        for file_name in os.listdir(settings.METRICS_DIR):
+            if file_name.endswith('.json'):
+                self.merge_file(
+                    values, os.path.join(settings.METRICS_DIR, file_name))
+        return values
+
+    def merge_exited(self, directory, pid):
+        """
+        Переносит значения завершившегося процесса pid в файл
+        EXITED_FILE каталога directory и удаляет файл процесса.
+        Вызывается только мастером gunicorn, поэтому общий файл
+        не пишут одновременно.
+        """
+        path = os.path.join(directory, f'{pid}.json')
+        if not os.path.exists(path):
+            return
+        exited = os.path.join(directory, EXITED_FILE)
+        values = {}
+        self.merge_file(values, exited)
+        self.merge_file(values, path)
+        self.write(exited, self.dump(values))
+        os.remove(path)
+
+    @staticmethod
+    def clear(directory):
+        """Удаляет файлы процессов прошлого запуска."""
+        if not os.path.isdir(directory):
+            return
+        for file_name in os.listdir(directory):
+            if file_name.endswith(('.json', '.json.tmp')):
+                os.remove(os.path.join(directory, file_name))
+
+    def expose(self):
+        """Метрики в текстовом формате Prometheus."""
+        lines = []
+        for name, values in self.collect().items():
+            metric = self.metrics[name]
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.type}')
+            lines.extend(metric.expose(values))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+atexit.register(REGISTRY.flush, force=True)
+
+VIEW_LABELS = ('view', 'action')
+REQUESTS = REGISTRY.register(Counter(
+    'http_requests_total',
+    'Requests by view action, method and status.',
+    (*VIEW_LABELS, 'method', 'status'),
+))
+THROTTLED = REGISTRY.register(Counter(
+    'http_requests_throttled_total',
+    'Requests rejected by throttling.',
+    VIEW_LABELS,
+))
+LATENCY = REGISTRY.register(Histogram(
+    'http_request_duration_seconds',
+    'Request latency.',
+    VIEW_LABELS,
+    LATENCY_BUCKETS,
+))
+RESPONSE_SIZE = REGISTRY.register(Histogram(
+    'http_response_size_bytes',
+    'Response body size (streaming responses are not counted).',
+    VIEW_LABELS,
+    SIZE_BUCKETS,
+))
+QUERIES = REGISTRY.register(Histogram(
+    'http_request_queries',
+    'SQL queries per request.',
+    VIEW_LABELS,
+    QUERIES_BUCKETS,
+))
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = perf_counter()
+        self.queries = 0
+
+    def observe(self, sql, duration):
+        self.queries += 1
+
+
+class MetricsMiddleware(ObservingMiddleware):
+    """
+    Метрики запросов с метками представления и действия
+    (например, RecipesViewSet и favorite).
+    """
+
+    def start(self, request):
+        request.metrics_labels = (UNKNOWN_VIEW, UNKNOWN_VIEW)
+        return RequestMetrics()
+
+    def finish(self, request, response, state):
+        duration = perf_counter() - state.started
+        labels = request.metrics_labels
+        with REGISTRY.lock:
+            REQUESTS.inc((*labels, request.method, str(response.status_code)))
+            if response.status_code == 429:
+                THROTTLED.inc(labels)
+            LATENCY.observe(labels, duration)
+            QUERIES.observe(labels, state.queries)
+            if not response.streaming:
+                RESPONSE_SIZE.observe(labels, len(response.content))
+        REGISTRY.flush()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, 'cls', None)
+        actions = getattr(view_func, 'actions', None) or {}
+        request.metrics_labels = (
+            view.__name__ if view else view_func.__name__,
+            actions.get(request.method.lower(), request.method.lower()),
+        )
+
+
+def metrics_view(request):
+    """Внутренний эндпоинт метрик (nginx его наружу не проксирует)."""
+    return HttpResponse(REGISTRY.expose(), content_type=CONTENT_TYPE)
@@ -21,6 +21,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
@@ -30,6 +31,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'config.metrics.MetricsMiddleware',
+    'config.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -59,6 +62,11 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'config.wsgi.application'
 
+# wsgi - gunicorn с синхронными воркерами, asgi - gunicorn с воркерами
+# uvicorn и асинхронными представлениями для частых запросов на чтение.
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+ASYNC_VIEWS = SERVER_MODE == 'asgi'
+
 
 if os.getenv('USE_SQLITE') == 'True':
     DATABASES = {
@@ -80,6 +88,45 @@ else:
     }
 
 
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', BASE_DIR / 'cache'),
+    },
+    # Версии данных (recipes.versions) - отдельно от вытесняемых записей:
+    # потерянная версия выдается заново, и все ETag по ней сбрасываются.
+    'versions': {
+        'BACKEND': os.getenv('VERSIONS_CACHE_BACKEND', CACHE_BACKEND),
+        'LOCATION': os.getenv(
+            'VERSIONS_CACHE_LOCATION', BASE_DIR / 'cache-versions'),
+    },
+}
+# Файловый, локальный и табличный кэши при MAX_ENTRIES записей удаляют
+# часть их (300 по умолчанию); кэш версий не должен достигать предела.
+CULLING_CACHE_BACKENDS = (
+    'django.core.cache.backends.filebased.FileBasedCache',
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.db.DatabaseCache',
+)
+if CACHES['versions']['BACKEND'] in CULLING_CACHE_BACKENDS:
+    CACHES['versions']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('VERSIONS_CACHE_MAX_ENTRIES', 10 ** 8)),
+    }
+
+
+INSTRUMENTATION_SAMPLE_RATE = float(
+    os.getenv('INSTRUMENTATION_SAMPLE_RATE', 0.1))
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'True') == 'True'
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', 500))
+SLOW_REQUEST_QUERIES = int(os.getenv('SLOW_REQUEST_QUERIES', 30))
+
+# Каталог для метрик процессов; нужен, если воркеров gunicorn несколько.
+METRICS_DIR = os.getenv('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -112,6 +159,10 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'collected_static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+IMAGE_UPLOAD_MAX_SIZE = int(
+    os.getenv('IMAGE_UPLOAD_MAX_SIZE', 20 * 1024 * 1024))
+IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', 40_000_000))
+
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -121,7 +172,7 @@ AUTH_USER_MODEL = 'recipes.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachingTokenAuthentication',
     ),
 
     'DEFAULT_PERMISSION_CLASSES': (
@@ -142,6 +193,16 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 6,
 }
 
+# Кэш токенов: размер LRU процесса, срок записи в секундах и хранение
+# в кэше Django, общем для воркеров.
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 300))
+TOKEN_CACHE_SHARED = os.getenv('TOKEN_CACHE_SHARED', 'False') == 'True'
+
+# Рецепты автора с большим числом подписчиков не раскладываются по лентам
+# при публикации, а читаются вместе с лентой.
+FEED_PULL_SUBSCRIBERS = int(os.getenv('FEED_PULL_SUBSCRIBERS', 1000))
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'SERIALIZERS': {
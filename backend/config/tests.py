@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+
+from .metrics import EXITED_FILE, Counter, Histogram, Registry
+
+
+class RegistryTest(SimpleTestCase):
+    """
+    /metrics складывает значения всех процессов, а значения
+    завершившихся воркеров сохраняются в общем файле.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings = override_settings(METRICS_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.registry = Registry()
+        self.requests = self.registry.register(
+            Counter('requests', 'Requests.', ('view',)))
+        self.latency = self.registry.register(
+            Histogram('latency', 'Latency.', ('view',), (0.1, 1)))
+
+    def write_worker(self, pid, requests, latency):
+        self.registry.write(
+            os.path.join(self.directory, f'{pid}.json'),
+            self.registry.dump({
+                'requests': {('recipes',): requests},
+                'latency': {('recipes',): latency},
+            })
+        )
+
+    def test_collect_merges_exited_workers(self):
+        self.write_worker(1, 2, [1, 1, 0, 1.5, 2])
+        self.write_worker(2, 3, [0, 0, 1, 7, 1])
+        self.registry.merge_exited(self.directory, 1)
+        self.write_worker(3, 1, [1, 0, 0, 0.25, 1])
+        self.registry.merge_exited(self.directory, 3)
+        self.requests.inc(('recipes',))
+        self.latency.observe(('recipes',), 0.5)
+        values = self.registry.collect()
+        self.assertEqual(values['requests'], {('recipes',): 7})
+        self.assertEqual(
+            values['latency'], {('recipes',): [2, 2, 1, 9.25, 5]})
+        self.assertEqual(
+            sorted(os.listdir(self.directory)),
+            sorted([EXITED_FILE, '2.json', f'{os.getpid()}.json'])
+        )
+
+    def test_clear(self):
+        self.write_worker(1, 2, [1, 1, 0, 1.5, 2])
+        self.registry.merge_exited(self.directory, 1)
+        self.write_worker(2, 3, [0, 0, 1, 7, 1])
+        self.registry.clear(self.directory)
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertEqual(self.registry.collect()['requests'], {})
@@ -0,0 +1,32 @@
+import multiprocessing
+import os
+
+
+bind = '0.0.0.0:8000'
+# Мастер читает настройки Django в обработчиках метрик.
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+if os.getenv('SERVER_MODE', 'wsgi') == 'asgi':
+    # Воркер uvicorn обслуживает много соединений сразу, поэтому
+    # их достаточно по числу ядер.
+    wsgi_app = 'config.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+else:
+    wsgi_app = 'config.wsgi'
+    workers = int(os.getenv(
+        'WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+
+
+def on_starting(server):
+    """Файлы метрик прошлого запуска сбрасываются (config.metrics)."""
+    if os.getenv('METRICS_DIR'):
+        from config.metrics import REGISTRY
+        REGISTRY.clear(os.getenv('METRICS_DIR'))
+
+
+def child_exit(server, worker):
+    """Значения завершившегося воркера переносятся в общий файл метрик."""
+    if os.getenv('METRICS_DIR'):
+        from config.metrics import REGISTRY
+        REGISTRY.merge_exited(os.getenv('METRICS_DIR'), worker.pid)
@@ -2,9 +2,13 @@ from django.contrib import admin
 from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import Group
+from django.db import transaction
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.safestring import mark_safe
 
+from .counters import change_counters, count_related
+from .feeds import push_recipe
 from .filters import (
     CookingTimeFilter,
     RecipesExistsFilter,
@@ -17,9 +21,11 @@ from .models import (
     Recipe,
     RecipeIngridients,
     ShoppingCart,
+    ShoppingCartTotal,
     Subscription,
     Tag,
 )
+from .paginators import PrimaryKeyCountPaginator
 
 
 User = get_user_model()
@@ -27,14 +33,28 @@ admin.site.unregister(Group)
 
 
 class RecipesCountMixin:
+    """
+    Число Рецептов записи одним запросом со списком. В recipes_queryset
+    и recipes_field указываются записи связи с Рецептом и ее поле.
+    """
+
+    paginator = PrimaryKeyCountPaginator
+    recipes_queryset = None
+    recipes_field = None
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            recipes_count=count_related(
+                self.recipes_queryset, self.recipes_field)
+        )
 
-    @admin.display(description='Рецептов')
+    @admin.display(description='Рецептов', ordering='recipes_count')
     def recipes_count(self, object):
-        return object.recipes.count()
+        return object.recipes_count
 
 
 @admin.register(User)
-class UserAdmin(RecipesCountMixin, BaseUserAdmin):
+class UserAdmin(BaseUserAdmin):
     """Настройка административной зоны для модели Пользователя."""
 
     list_display = (
@@ -44,7 +64,7 @@ class UserAdmin(RecipesCountMixin, BaseUserAdmin):
         'full_name',
         'email',
         'recipes_count',
-        'subscriprions_count',
+        'subscriptions_count',
         'subscribers_count',
         'is_staff',
     )
@@ -56,12 +76,13 @@ class UserAdmin(RecipesCountMixin, BaseUserAdmin):
     )
     list_display_links = ('email', 'username')
     list_editable = ('is_staff',)
+    paginator = PrimaryKeyCountPaginator
 
     @mark_safe
-    @admin.display(description='Рецептов')
+    @admin.display(description='Рецептов', ordering='recipes_count')
     def recipes_count(self, user):
         model = Recipe
-        count = super().recipes_count(user)
+        count = user.recipes_count
         return (
             u'<a href="{}?author__id__exact={}">{}</a>'.format(
                 reverse('admin:{}_{}_changelist'.format(
@@ -77,14 +98,6 @@ class UserAdmin(RecipesCountMixin, BaseUserAdmin):
     def full_name(self, user):
         return user.full_name
 
-    @admin.display(description='Подписок')
-    def subscriprions_count(self, user):
-        return user.subscribers.count()
-
-    @admin.display(description='Подписчиков')
-    def subscribers_count(self, user):
-        return user.authors.count()
-
     @mark_safe
     @admin.display(description='Аватар')
     def avatar_preview(self, user):
@@ -109,6 +122,8 @@ class IngredientAdmin(RecipesCountMixin, admin.ModelAdmin):
     list_display = ('id', 'name', 'measurement_unit', 'recipes_count')
     search_fields = ('name', 'measurement_unit')
     list_filter = ('measurement_unit',)
+    recipes_queryset = RecipeIngridients.objects.all()
+    recipes_field = 'ingredient'
 
 
 @admin.register(Tag)
@@ -118,6 +133,8 @@ class TagAdmin(RecipesCountMixin, admin.ModelAdmin):
     list_display = ('id', 'name', 'slug', 'recipes_count')
     list_display_links = ('name', 'slug',)
     search_fields = ('name', 'slug')
+    recipes_queryset = Recipe.tags.through.objects.all()
+    recipes_field = 'tag'
 
 
 class RecipeIngridientsInline(admin.TabularInline):
@@ -139,11 +156,13 @@ class RecipeAdmin(admin.ModelAdmin):
         'cooking_time',
         'get_ingredients',
         'author',
-        'count_favorites',
+        'favorites_count',
+        'shopping_carts_count',
     )
     list_display_links = ('name',)
     search_fields = ('author__username', 'author__first_name', 'name')
     list_select_related = ('author',)
+    paginator = PrimaryKeyCountPaginator
     list_filter = ('tags', 'author', CookingTimeFilter)
     filter_horizontal = ('tags',)
     inlines = (RecipeIngridientsInline,)
@@ -160,9 +179,24 @@ class RecipeAdmin(admin.ModelAdmin):
         }),
     )
 
-    @admin.display(description='в Избранном')
-    def count_favorites(self, recipe):
-        return recipe.favorites.count()
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(
+            'tags', 'recipe_ingridients__ingredient')
+
+    def save_model(self, request, recipe, form, change):
+        super().save_model(request, recipe, form, change)
+        if change and 'author' in form.changed_data:
+            change_counters(Recipe(author_id=form.initial['author']), -1)
+            change_counters(recipe, 1)
+            push_recipe(recipe)
+
+    def save_related(self, request, form, formsets, change):
+        recipe = form.instance
+        old_amounts = recipe.get_ingredient_amounts() if change else {}
+        super().save_related(request, form, formsets, change)
+        if change:
+            ShoppingCartTotal.objects.change_recipe_amounts(
+                recipe, old_amounts, recipe.get_ingredient_amounts())
 
     @mark_safe
     @admin.display(description='Фото')
@@ -191,7 +225,46 @@ class RecipeIngridientsAdmin(admin.ModelAdmin):
 
     list_display = ('id', 'recipe', 'ingredient', 'amount',)
     search_fields = ('recipe__name',)
-    list_select_related = ('recipe',)
+    list_select_related = ('recipe__author', 'ingredient')
+
+    @staticmethod
+    def get_amounts(recipe_ids):
+        """Меры Продуктов Рецептов: {Рецепт: {id Продукта: мера}}."""
+        return {
+            recipe: recipe.get_ingredient_amounts()
+            for recipe in Recipe.objects.filter(pk__in=recipe_ids)
+        }
+
+    @staticmethod
+    def change_totals(old_amounts):
+        """
+        Переносит изменение Продуктов в итоги Списков покупок с Рецептами
+        и в updated_at Рецептов, как при сохранении Рецепта.
+        """
+        for recipe, amounts in old_amounts.items():
+            ShoppingCartTotal.objects.change_recipe_amounts(
+                recipe, amounts, recipe.get_ingredient_amounts())
+        Recipe.objects.filter(
+            pk__in=[recipe.pk for recipe in old_amounts]
+        ).update(updated_at=timezone.now())
+
+    def save_model(self, request, item, form, change):
+        old_amounts = self.get_amounts(
+            [item.recipe_id, form.initial.get('recipe')])
+        super().save_model(request, item, form, change)
+        self.change_totals(old_amounts)
+
+    def delete_model(self, request, item):
+        old_amounts = self.get_amounts([item.recipe_id])
+        super().delete_model(request, item)
+        self.change_totals(old_amounts)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            old_amounts = self.get_amounts(
+                queryset.values_list('recipe', flat=True))
+            super().delete_queryset(request, queryset)
+            self.change_totals(old_amounts)
 
 
 @admin.register(Favorite, ShoppingCart)
@@ -200,4 +273,4 @@ class ShoppingCartAndFavoriteAdmin(admin.ModelAdmin):
 
     list_display = ('id', 'user', 'recipe')
     search_fields = ('user__username', 'user__first_name',)
-    list_select_related = ('user', 'recipe',)
+    list_select_related = ('user', 'recipe__author')
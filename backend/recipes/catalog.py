@@ -0,0 +1,91 @@
+from bisect import bisect_left, bisect_right
+from threading import Lock
+
+from .models import Ingredient, Tag
+from .versions import CATALOG_VERSION_KEY, bump_version, get_version
+
+
+SEARCH_SEPARATOR = '\n'
+PREFIX_END = '\uffff'
+
+_catalog = None
+_catalog_lock = Lock()
+
+
+class Catalog:
+    """
+    Снимок Тегов и Продуктов в памяти процесса.
+    Продукты ищутся по началу названия двоичным поиском
+    и по подстроке поиском в общей строке названий.
+    """
+
+    def __init__(self, version):
+        self.version = version
+        self.tags = list(Tag.objects.all())
+        self.tags_by_id = {tag.id: tag for tag in self.tags}
+        self.tags_by_slug = {tag.slug: tag for tag in self.tags}
+        self.ingredients = list(Ingredient.objects.all())
+        self.ingredients_by_id = {
+            ingredient.id: ingredient for ingredient in self.ingredients
+        }
+        self.search_ingredients = sorted(
+            self.ingredients,
+            key=lambda ingredient: ingredient.name.lower()
+        )
+        self.search_names = [
+            ingredient.name.lower() for ingredient in self.search_ingredients
+        ]
+        self.search_text = SEARCH_SEPARATOR.join(self.search_names)
+        self.search_offsets = []
+        offset = 0
+        for name in self.search_names:
+            self.search_offsets.append(offset)
+            offset += len(name) + len(SEARCH_SEPARATOR)
+
+    def search(self, name, limit):
+        """
+        Продукты, название которых начинается с name, затем содержащие
+        name. Если таких нет, поиск похожих названий уходит в БД.
+        """
+        name = name.lower()
+        if not name:
+            return self.search_ingredients[:limit]
+        start = bisect_left(self.search_names, name)
+        end = min(
+            bisect_right(self.search_names, name + PREFIX_END),
+            start + limit
+        )
+        found = list(range(start, end))
+        position = self.search_text.find(name)
+        while position != -1 and len(found) < limit:
+            index = bisect_right(self.search_offsets, position) - 1
+            found_name = self.search_names[index]
+            if name in found_name and not found_name.startswith(name):
+                found.append(index)
+            position = self.search_text.find(
+                name,
+                self.search_offsets[index] + len(self.search_names[index])
+            )
+        if not found:
+            return list(Ingredient.objects.search(name)[:limit])
+        return [self.search_ingredients[index] for index in found]
+
+
+def get_catalog():
+    """Каталог текущей версии; устаревший каталог загружается заново."""
+    global _catalog
+    version = get_version(CATALOG_VERSION_KEY)
+    if version is None:
+        return Catalog(version)
+    catalog = _catalog
+    if catalog is not None and catalog.version == version:
+        return catalog
+    with _catalog_lock:
+        if _catalog is None or _catalog.version != version:
+            _catalog = Catalog(version)
+        return _catalog
+
+
+def invalidate_catalog():
+    """Новая версия каталога для всех процессов."""
+    bump_version(CATALOG_VERSION_KEY)
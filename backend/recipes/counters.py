@@ -0,0 +1,199 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from math import isclose, log, log2
+
+from django.db import transaction
+from django.db.models import (
+    Case, Count, F, FloatField, OuterRef, Subquery, Value, When
+)
+from django.db.models.functions import Coalesce, Greatest, Least, Ln, Power
+from django.utils import timezone
+
+from .models import (
+    TRENDING_EMPTY,
+    Favorite,
+    Recipe,
+    ShoppingCart,
+    Subscription,
+    User,
+)
+from .versions import bump_auth_version
+
+
+# Счетчики по модели связи: (поле связи, модель счетчика, поле счетчика).
+COUNTERS = {
+    Favorite: (('recipe', Recipe, 'favorites_count'),),
+    ShoppingCart: (('recipe', Recipe, 'shopping_carts_count'),),
+    Subscription: (
+        ('user', User, 'subscriptions_count'),
+        ('author', User, 'subscribers_count'),
+    ),
+    Recipe: (('author', User, 'recipes_count'),),
+}
+# Веса добавления в Избранное и в Список покупок в популярности Рецепта.
+# Изменение популярности меняет updated_at Рецепта, а с ним ETag списков
+# и карточек: от нее зависят favorites_count и порядок рецептов в API.
+SCORE_WEIGHTS = {Favorite: 2, ShoppingCart: 1}
+# Популярность с затуханием (trending) - двоичный логарифм суммы весов
+# добавлений, каждый умножен на 2 ** ((время добавления - TRENDING_EPOCH)
+# / TRENDING_HALF_LIFE). Это затухание с периодом полураспада
+# TRENDING_HALF_LIFE, умноженное на общий для всех Рецептов множитель,
+# который не меняет их порядок. Поэтому сумму не нужно пересчитывать
+# со временем: добавление прибавляет свой вклад, удаление вычитает его
+# по created_at. Сама сумма вышла бы за пределы float через 1000 периодов
+# полураспада, а логарифм растет на 1 за период. Вклады меньше
+# 2 ** -TRENDING_PRECISION суммы ее не меняют.
+TRENDING_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+TRENDING_HALF_LIFE = timedelta(days=7)
+TRENDING_PRECISION = 30
+
+
+def count_related(queryset, field):
+    """
+    Число записей queryset, ссылающихся полем field на запись внешнего
+    запроса. Подзапрос для каждого счетчика, а не Count по JOIN:
+    несколько счетчиков не умножают строки друг на друга.
+    """
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+                field).annotate(count=Count('pk')).values('count')
+        ),
+        0
+    )
+
+
+def get_trending_contribution(weight, created_at):
+    """Логарифм вклада добавления в популярность с затуханием."""
+    return log2(weight) + (created_at - TRENDING_EPOCH) / TRENDING_HALF_LIFE
+
+
+def add_trending(trending, contribution):
+    """log2(2 ** trending + 2 ** contribution) без выхода за пределы float."""
+    high, low = max(trending, contribution), min(trending, contribution)
+    return high + log2(1 + 2 ** (low - high))
+
+
+def change_trending(contribution, delta):
+    """
+    Выражение популярности с затуханием после добавления (delta=1)
+    или удаления (delta=-1) вклада с логарифмом contribution. Малые
+    по TRENDING_PRECISION вклады не считаются: POWER в PostgreSQL
+    не возвращает 0, а завершается ошибкой.
+    """
+    trending = F('trending')
+    contribution = Value(contribution, output_field=FloatField())
+    if delta > 0:
+        return Case(
+            When(
+                trending__gt=contribution + TRENDING_PRECISION,
+                then=trending
+            ),
+            When(
+                trending__lt=contribution - TRENDING_PRECISION,
+                then=contribution
+            ),
+            default=Greatest(trending, contribution) + Ln(
+                1.0 + Power(
+                    2.0,
+                    Least(trending, contribution)
+                    - Greatest(trending, contribution)
+                )
+            ) / log(2)
+        )
+    return Case(
+        When(trending__gt=contribution + TRENDING_PRECISION, then=trending),
+        When(
+            trending__lt=contribution + 2.0 ** -TRENDING_PRECISION,
+            then=Value(TRENDING_EMPTY)
+        ),
+        default=trending + Ln(
+            1.0 - Power(2.0, contribution - trending)) / log(2)
+    )
+
+
+def change_counters(instance, delta):
+    """
+    Изменение счетчиков и популярности при добавлении (delta=1)
+    или удалении (delta=-1) записи связи одним UPDATE с F():
+    в транзакции записи и без гонок между параллельными запросами.
+    """
+    weight = SCORE_WEIGHTS.get(type(instance))
+    for field, model, counter in COUNTERS[type(instance)]:
+        changes = {counter: Greatest(F(counter) + delta, 0)}
+        if weight:
+            changes.update(
+                popularity=Greatest(F('popularity') + delta * weight, 0),
+                trending=change_trending(
+                    get_trending_contribution(weight, instance.created_at),
+                    delta
+                ),
+                updated_at=timezone.now(),
+            )
+        pk = getattr(instance, f'{field}_id')
+        model.objects.filter(pk=pk).update(**changes)
+        if model is User:
+            # Копии пользователя в кэше токенов (api.authentication)
+            # устарели.
+            transaction.on_commit(lambda pk=pk: bump_auth_version(pk))
+
+
+def reconcile_counters(batch_size=1000):
+    """
+    Пересчет разошедшихся счетчиков (после массовых операций
+    без сигналов). Возвращает {поле счетчика: исправлено записей}.
+    """
+    fixed = {}
+    for related_model, counters in COUNTERS.items():
+        for field, model, counter in counters:
+            actual = count_related(related_model.objects.all(), field)
+            drifted = list(model.objects.annotate(actual=actual).exclude(
+                **{counter: F('actual')}).values_list('pk', flat=True))
+            for start in range(0, len(drifted), batch_size):
+                model.objects.filter(
+                    pk__in=drifted[start:start + batch_size]
+                ).update(**{counter: actual})
+            fixed[counter] = len(drifted)
+    return fixed
+
+
+def calculate_scores():
+    """
+    Популярность Рецептов, посчитанная заново по Избранному и Спискам
+    покупок: {id Рецепта: [популярность, популярность с затуханием]}.
+    """
+    scores = defaultdict(lambda: [0, TRENDING_EMPTY])
+    for model, weight in SCORE_WEIGHTS.items():
+        for recipe_id, created_at in model.objects.values_list(
+            'recipe', 'created_at'
+        ).order_by().iterator():
+            score = scores[recipe_id]
+            score[0] += weight
+            score[1] = add_trending(
+                score[1], get_trending_contribution(weight, created_at))
+    return scores
+
+
+def refresh_scores(batch_size=1000):
+    """
+    Пересчет популярности Рецептов (после массовых операций без
+    сигналов и от накопленной ошибки округления). Возвращает число
+    исправленных Рецептов.
+    """
+    scores = calculate_scores()
+    now = timezone.now()
+    changed = []
+    for recipe in Recipe.objects.only(
+        'popularity', 'trending'
+    ).order_by().iterator():
+        popularity, trending = scores.get(recipe.pk, (0, TRENDING_EMPTY))
+        if recipe.popularity != popularity or not isclose(
+            recipe.trending, trending, abs_tol=2 ** -TRENDING_PRECISION
+        ):
+            recipe.popularity = popularity
+            recipe.trending = trending
+            recipe.updated_at = now
+            changed.append(recipe)
+    Recipe.objects.bulk_update(
+        changed, ('popularity', 'trending', 'updated_at'), batch_size)
+    return len(changed)
@@ -0,0 +1,120 @@
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import FeedEntry, Recipe, Subscription, User
+from .paginators import after
+from .versions import bump_auth_version
+
+
+BATCH_SIZE = 1000
+
+
+def add_entries(entries):
+    """
+    Записи лент из троек (id пользователя, id Рецепта, дата публикации)
+    пачками по BATCH_SIZE.
+    """
+    entries = iter(entries)
+    batch = list(islice(entries, BATCH_SIZE))
+    while batch:
+        FeedEntry.objects.bulk_create(
+            [
+                FeedEntry(
+                    user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+                for user_id, recipe_id, pub_date in batch
+            ],
+            ignore_conflicts=True
+        )
+        batch = list(islice(entries, BATCH_SIZE))
+
+
+def push_recipe(recipe):
+    """
+    Рецепт в ленты подписчиков автора (раздача при записи). Число записей
+    ограничено FEED_PULL_SUBSCRIBERS: Рецепты авторов с большим числом
+    подписчиков (feed_pull) читаются вместе с лентой. Прежние записи
+    Рецепта удаляются: после смены автора Рецепт уходит из лент
+    подписчиков прежнего автора.
+    """
+    FeedEntry.objects.filter(recipe=recipe).delete()
+    if User.objects.filter(pk=recipe.author_id, feed_pull=True).exists():
+        return
+    add_entries(
+        (user_id, recipe.pk, recipe.pub_date)
+        for user_id in Subscription.objects.filter(
+            author=recipe.author_id).values_list('user', flat=True)
+    )
+
+
+def add_subscription(subscription):
+    """
+    Рецепты автора в ленту нового подписчика. Автор, у которого стало
+    больше FEED_PULL_SUBSCRIBERS подписчиков, переходит на чтение
+    Рецептов вместе с лентой; обратно не переходит, чтобы его Рецепты
+    не выпали из лент.
+    """
+    feed_pull, subscribers_count = User.objects.values_list(
+        'feed_pull', 'subscribers_count').get(pk=subscription.author_id)
+    if feed_pull:
+        return
+    if subscribers_count > settings.FEED_PULL_SUBSCRIBERS:
+        User.objects.filter(pk=subscription.author_id).update(feed_pull=True)
+        transaction.on_commit(
+            lambda: bump_auth_version(subscription.author_id))
+        return
+    add_entries(
+        (subscription.user_id, recipe_id, pub_date)
+        for recipe_id, pub_date in Recipe.objects.filter(
+            author=subscription.author_id
+        ).values_list('pk', 'pub_date').order_by().iterator()
+    )
+
+
+def remove_subscription(subscription):
+    FeedEntry.objects.filter(
+        user=subscription.user_id,
+        recipe__author=subscription.author_id
+    ).delete()
+
+
+def get_feed(user, position, limit):
+    """
+    Ключи (дата публикации, id) limit Рецептов ленты пользователя после
+    position: записи ленты по индексу (пользователь, дата) и Рецепты
+    авторов с feed_pull из подписок - по одному запросу.
+    """
+    entries = FeedEntry.objects.filter(user=user)
+    recipes = Recipe.objects.filter(author__in=Subscription.objects.filter(
+        user=user, author__feed_pull=True).values('author'))
+    if position is not None:
+        entries = entries.filter(after(position, 'pub_date', 'recipe_id'))
+        recipes = recipes.filter(after(position, 'pub_date', 'id'))
+    keys = {
+        *entries.order_by('-pub_date', '-recipe_id').values_list(
+            'pub_date', 'recipe_id')[:limit],
+        *recipes.order_by('-pub_date', '-id').values_list(
+            'pub_date', 'id')[:limit],
+    }
+    return sorted(keys, reverse=True)[:limit]
+
+
+def rebuild_feeds():
+    """
+    Ленты всех пользователей заново (после массовых операций без
+    сигналов). Возвращает число записей.
+    """
+    User.objects.filter(
+        feed_pull=False,
+        subscribers_count__gt=settings.FEED_PULL_SUBSCRIBERS
+    ).update(feed_pull=True)
+    FeedEntry.objects.all().delete()
+    add_entries(
+        Subscription.objects.filter(
+            author__feed_pull=False, author__recipes__isnull=False
+        ).values_list(
+            'user', 'author__recipes', 'author__recipes__pub_date'
+        ).order_by().iterator()
+    )
+    return FeedEntry.objects.count()
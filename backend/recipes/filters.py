@@ -1,10 +1,16 @@
+import re
+
 from django.contrib import admin
-from django.db.models import Count
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.core.cache import cache
+from django.db.models import Count, Exists, OuterRef
 
 
 LABELS = [('exists', 'да'), ('no', 'нет'), ]
 LESS_FORMAT = 'до {} мин ({})'
 MORE_FORMAT = 'больше ({})'
+RANGE = re.compile(r'(\d+)-(\d*)')
+RANGES_CACHE_TIMEOUT = 60 * 60
 
 
 class ExistsBaseFilter(admin.SimpleListFilter):
@@ -17,14 +23,13 @@ class ExistsBaseFilter(admin.SimpleListFilter):
     def lookups(self, request, model_admin):
         return LABELS
 
-    def queryset(self, request, users):
-        users_with_count = users.annotate(
-            parameter_quantity=Count(self.parameter_name))
-        if self.value() == 'exists':
-            return users_with_count.filter(parameter_quantity__gt=0)
-        if self.value() == 'no':
-            return users_with_count.filter(parameter_quantity=0)
-        return users
+    def queryset(self, request, objects):
+        if self.value() not in ('exists', 'no'):
+            return objects
+        relation = objects.model._meta.get_field(self.parameter_name)
+        exists = Exists(relation.related_model.objects.filter(
+            **{relation.field.name: OuterRef('pk')}))
+        return objects.filter(exists if self.value() == 'exists' else ~exists)
 
 
 class RecipesExistsFilter(ExistsBaseFilter):
@@ -42,43 +47,98 @@ class SubcriptionsExistsFilter(ExistsBaseFilter):
     parameter_name = 'subscribers'
 
 
-class CookingTimeFilter(admin.SimpleListFilter):
+class QuantileRangeFilter(admin.SimpleListFilter):
+    """
+    Базовый класс для фильтров по диапазонам значений числового поля
+    field_name: границы - квантили по числу записей, посчитанные
+    вместе с числом записей в каждом диапазоне одним запросом
+    с группировкой. Диапазоны хранятся в кэше по ключу cache_key,
+    ключ удаляется при изменении записей (см. signals).
+    Значение параметра - "начало-конец" или "начало-" для последнего
+    диапазона.
+    """
+
+    field_name = None
+    ranges_number = 4
+    cache_key = None
+
+    def lookups(self, request, model_admin):
+        return [
+            (
+                f'{start}-{end}' if end is not None else f'{start}-',
+                self.get_label(start, end, count)
+            )
+            for start, end, count in self.get_ranges(
+                model_admin.get_queryset(request))
+        ]
+
+    @classmethod
+    def invalidate(cls):
+        cache.delete(cls.cache_key)
+
+    def get_label(self, start, end, count):
+        raise NotImplementedError
+
+    def queryset(self, request, objects):
+        if not self.value():
+            return objects
+        match = RANGE.fullmatch(self.value())
+        if match is None:
+            raise IncorrectLookupParameters(self.value())
+        start, end = match.groups()
+        if end:
+            return objects.filter(
+                **{f'{self.field_name}__range': (start, end)})
+        return objects.filter(**{f'{self.field_name}__gte': start})
+
+    def get_ranges(self, objects):
+        ranges = cache.get(self.cache_key)
+        if ranges is None:
+            ranges = self.get_quantile_ranges(objects.order_by().values_list(
+                self.field_name
+            ).annotate(count=Count('pk')).order_by(self.field_name))
+            cache.set(self.cache_key, ranges, RANGES_CACHE_TIMEOUT)
+        return ranges
+
+    def get_quantile_ranges(self, counts):
+        """
+        Диапазоны [(начало, конец или None, число записей)] по парам
+        (значение, число записей): значение не делится между
+        диапазонами, поэтому при частых значениях диапазонов
+        может быть меньше ranges_number.
+        """
+        counts = list(counts)
+        if len(counts) < self.ranges_number:
+            return []
+        total = sum(count for _, count in counts)
+        ranges = []
+        start = None
+        in_range = seen = 0
+        for value, count in counts:
+            if start is None:
+                start = value
+            in_range += count
+            seen += count
+            if (
+                len(ranges) < self.ranges_number - 1
+                and seen * self.ranges_number >= total * (len(ranges) + 1)
+            ):
+                ranges.append((start, value, in_range))
+                start = None
+                in_range = 0
+        if start is None:
+            start, _, in_range = ranges.pop()
+        ranges.append((start, None, in_range))
+        return ranges
+
+
+class CookingTimeFilter(QuantileRangeFilter):
     title = 'Время приготовления'
     parameter_name = 'cooking_time'
+    field_name = 'cooking_time'
+    cache_key = 'recipes:cooking-time-ranges'
 
-    def lookups(self, request, model_admin):
-        recipes = model_admin.get_queryset(request)
-        time_ranges = self.get_time_ranges(recipes=recipes, ranges_number=4)
-        return (time_ranges and [(range_, LESS_FORMAT.format(
-            range_[1], self.get_recipes_between(recipes, range_).count()))
-            if range_ != time_ranges[-1]
-            else (range_, MORE_FORMAT.format(
-                self.get_recipes_between(recipes, range_).count()))
-            for range_ in time_ranges])
-
-    def queryset(self, request, recipes):
-        if self.value():
-            return self.get_recipes_between(recipes, eval(self.value()))
-        return recipes
-
-    def get_time_ranges(self, recipes, ranges_number):
-        cooking_times = sorted(list(set(
-            item[0] for item in recipes.values_list('cooking_time')
-        )))
-        times_length = len(cooking_times)
-        if times_length < ranges_number or ranges_number == 1:
-            return None
-        index_step = times_length // ranges_number
-        return [self.get_first_and_last(
-            cooking_times[i * index_step:(i + 1) * index_step])
-            if i < ranges_number - 1
-            else self.get_first_and_last(cooking_times[i * index_step:])
-            for i in range(ranges_number)]
-
-    @staticmethod
-    def get_first_and_last(elements):
-        return elements[0], elements[-1]
-
-    @staticmethod
-    def get_recipes_between(recipes, range_):
-        return recipes.filter(cooking_time__range=range_)
+    def get_label(self, start, end, count):
+        if end is None:
+            return MORE_FORMAT.format(count)
+        return LESS_FORMAT.format(end, count)
@@ -0,0 +1,59 @@
+import os
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+
+VARIANTS_DIR = 'variants'
+# Вариант: (расширение, наибольшая сторона в пикселях).
+IMAGE_VARIANTS = {
+    'thumbnail': ('jpg', 320),
+    'medium': ('jpg', 960),
+    'webp': ('webp', 960),
+}
+IMAGE_FORMATS = {'jpg': 'JPEG', 'webp': 'WEBP'}
+IMAGE_QUALITY = 82
+BACKGROUND_COLOR = 'white'
+# Модель: (поле изображения, поле с именами вариантов).
+IMAGE_FIELDS = {
+    'recipes.recipe': ('image', 'image_variants'),
+    'recipes.user': ('avatar', 'avatar_variants'),
+}
+
+
+def get_variant_names(name):
+    """Имена файлов вариантов изображения: {вариант: имя}."""
+    stem = os.path.splitext(name)[0]
+    return {
+        variant: f'{VARIANTS_DIR}/{stem}_{variant}.{extension}'
+        for variant, (extension, size) in IMAGE_VARIANTS.items()
+    }
+
+
+def render_variants(data):
+    """
+    Варианты изображения из содержимого исходного файла:
+    {вариант: содержимое}. Не обращается к БД и хранилищу,
+    поэтому выполняется в отдельных процессах.
+    """
+    with Image.open(BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        if image.mode == 'RGBA':
+            background = Image.new('RGB', image.size, BACKGROUND_COLOR)
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        variants = {}
+        for variant, (extension, size) in IMAGE_VARIANTS.items():
+            resized = image.copy()
+            resized.thumbnail((size, size), Image.LANCZOS)
+            buffer = BytesIO()
+            resized.save(
+                buffer,
+                IMAGE_FORMATS[extension],
+                quality=IMAGE_QUALITY,
+                optimize=True
+            )
+            variants[variant] = buffer.getvalue()
+        return variants
@@ -0,0 +1,116 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.images import (IMAGE_FIELDS, IMAGE_VARIANTS, VARIANTS_DIR,
+                            get_variant_names)
+
+
+MIN_AGE = 60 * 60
+REPORT = ('Файлов: {total}, используются: {used}, '
+          'удалено: {removed} ({size} байт).')
+DRY_RUN_REPORT = ('Файлов: {total}, используются: {used}, '
+                  'будет удалено: {removed} ({size} байт).')
+
+
+def count_references():
+    """Число ссылок из БД на каждый файл изображений и их вариантов."""
+    references = Counter()
+    for label, (image_field, variants_field) in IMAGE_FIELDS.items():
+        for name in apps.get_model(label).objects.filter(
+            **{f'{image_field}__gt': ''}
+        ).values_list(image_field, flat=True).iterator():
+            references[name] += 1
+            references.update(get_variant_names(name).values())
+    return references
+
+
+def is_referenced(name):
+    """
+    Ссылается ли БД на файл сейчас. Для варианта проверяется исходное
+    изображение: его имя - имя варианта без каталога и суффикса.
+    """
+    lookup = 'exact'
+    for variant, (extension, size) in IMAGE_VARIANTS.items():
+        prefix, suffix = f'{VARIANTS_DIR}/', f'_{variant}.{extension}'
+        if name.startswith(prefix) and name.endswith(suffix):
+            name = name[len(prefix):-len(suffix)] + '.'
+            lookup = 'startswith'
+            break
+    return any(
+        apps.get_model(label).objects.filter(
+            **{f'{image_field}__{lookup}': name}).exists()
+        for label, (image_field, variants_field) in IMAGE_FIELDS.items()
+    )
+
+
+def get_media_dirs():
+    """Каталоги хранилища с изображениями моделей и их вариантами."""
+    return [
+        apps.get_model(label)._meta.get_field(
+            image_field).upload_to.strip('/')
+        for label, (image_field, variants_field) in IMAGE_FIELDS.items()
+    ] + [VARIANTS_DIR]
+
+
+def walk(storage, directory):
+    """Имена всех файлов каталога хранилища, включая вложенные."""
+    if not storage.exists(directory):
+        return
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield f'{directory}/{name}'
+    for name in directories:
+        yield from walk(storage, f'{directory}/{name}')
+
+
+class Command(BaseCommand):
+    """
+    Команда на удаление изображений, на которые не ссылается ни один
+    Рецепт и Пользователь. Недавние файлы не трогаются: они могут
+    принадлежать еще не завершенной загрузке. Ссылки считаются одним
+    проходом в начале и проверяются заново перед удалением каждого
+    файла: за время обхода на него могли сослаться.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=MIN_AGE,
+            help='Удалять файлы старше указанного числа секунд.'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать неиспользуемые файлы.'
+        )
+
+    def handle(self, *args, **options):
+        references = count_references()
+        created_before = timezone.now() - timedelta(
+            seconds=options['min_age'])
+        total = used = removed = size = 0
+        for directory in get_media_dirs():
+            for name in list(walk(default_storage, directory)):
+                total += 1
+                if references[name]:
+                    used += 1
+                    continue
+                if default_storage.get_modified_time(name) > created_before:
+                    continue
+                if is_referenced(name):
+                    used += 1
+                    continue
+                removed += 1
+                size += default_storage.size(name)
+                if not options['dry_run']:
+                    default_storage.delete(name)
+        self.stdout.write(
+            (DRY_RUN_REPORT if options['dry_run'] else REPORT).format(
+                total=total, used=used, removed=removed, size=size)
+        )
@@ -1,19 +1,14 @@
-import os
-
-from django.core.management.base import BaseCommand
-
-from ..utils import load_from_json
-from config.settings import BASE_DIR
 from recipes.models import Ingredient
 
-
-FILENAME = 'ingredients.json'
-
-path = os.path.join(BASE_DIR, f'data/{FILENAME}')
+from ..utils import ImportCommand
 
 
-class Command(BaseCommand):
+class Command(ImportCommand):
     """Команда на запись Продуктов в базу данных из ingredients.json."""
 
-    def handle(self, *args, **options):
-        load_from_json(model=Ingredient, path=path)
+    model = Ingredient
+    filename = 'ingredients.json'
+    fields = ('name', 'measurement_unit')
+    key_fields = ('name', 'measurement_unit')
+    lookup_field = 'name'
+    update_fields = ('measurement_unit',)
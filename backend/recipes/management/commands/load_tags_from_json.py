@@ -1,19 +1,14 @@
-import os
-
-from django.core.management.base import BaseCommand
-
-from ..utils import load_from_json
-from config.settings import BASE_DIR
 from recipes.models import Tag
 
-
-FILENAME = 'tags.json'
-
-path = os.path.join(BASE_DIR, f'data/{FILENAME}')
+from ..utils import ImportCommand
 
 
-class Command(BaseCommand):
+class Command(ImportCommand):
     """Команда на запись Тегов в базу данных из tags.json."""
 
-    def handle(self, *args, **options):
-        load_from_json(model=Tag, path=path)
+    model = Tag
+    filename = 'tags.json'
+    fields = ('name', 'slug')
+    key_fields = ('slug',)
+    lookup_field = 'slug'
+    update_fields = ('name',)
@@ -0,0 +1,129 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from recipes.images import IMAGE_FIELDS, get_variant_names, render_variants
+from recipes.models import ImageTask
+from recipes.versions import (AUTHORS_VERSION_KEY, bump_auth_version,
+                              bump_version)
+
+
+BATCH_SIZE = 20
+MAX_ATTEMPTS = 3
+POLL_INTERVAL = 5
+PROCESSED = 'Обработано изображений: {count}.'
+TASK_FAILED = 'Не удалось обработать {task}: {error}'
+
+
+class Command(BaseCommand):
+    """
+    Команда на подготовку вариантов изображений из очереди ImageTask.
+    Изображения обрабатываются в пуле процессов; с --loop команда
+    работает постоянно и ждет новые задачи.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Число процессов обработки (по умолчанию - число CPU).'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Число задач, забираемых из очереди за раз.'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Не завершаться, когда очередь пуста.'
+        )
+
+    def handle(self, *args, **options):
+        with ProcessPoolExecutor(options['workers']) as pool:
+            while True:
+                count = self.process_batch(pool, options['batch_size'])
+                if count:
+                    self.stdout.write(PROCESSED.format(count=count))
+                    continue
+                if not options['loop']:
+                    return
+                time.sleep(POLL_INTERVAL)
+
+    @transaction.atomic
+    def process_batch(self, pool, batch_size):
+        """
+        Забирает задачи из очереди (занятые другим обработчиком
+        пропускаются) и сохраняет готовые варианты.
+        """
+        tasks = list(
+            ImageTask.objects.select_for_update(skip_locked=True)[:batch_size]
+        )
+        jobs = []
+        for task in tasks:
+            image_field, variants_field = IMAGE_FIELDS[task.model]
+            model = apps.get_model(task.model)
+            objects = model.objects.filter(
+                pk=task.object_id, **{image_field: task.image})
+            if not objects.exists():
+                task.delete()
+                continue
+            if all(
+                default_storage.exists(name)
+                for name in get_variant_names(task.image).values()
+            ):
+                # Варианты того же содержимого уже подготовлены.
+                jobs.append((task, objects, variants_field, None))
+                continue
+            storage = model._meta.get_field(image_field).storage
+            try:
+                with storage.open(task.image) as file:
+                    data = file.read()
+            except OSError as error:
+                self.fail(task, error)
+                continue
+            jobs.append((
+                task, objects, variants_field,
+                pool.submit(render_variants, data)
+            ))
+        for task, objects, variants_field, job in jobs:
+            names = get_variant_names(task.image)
+            if job is not None:
+                try:
+                    variants = job.result()
+                except Exception as error:
+                    self.fail(task, error)
+                    continue
+                for variant, content in variants.items():
+                    if default_storage.exists(names[variant]):
+                        default_storage.delete(names[variant])
+                    default_storage.save(names[variant], ContentFile(content))
+            changes = {variants_field: names}
+            if task.model == 'recipes.recipe':
+                changes['updated_at'] = timezone.now()
+            objects.update(**changes)
+            if task.model == 'recipes.user':
+                transaction.on_commit(
+                    lambda: bump_version(AUTHORS_VERSION_KEY))
+                # Копии пользователя в кэше токенов (api.authentication)
+                # устарели.
+                transaction.on_commit(
+                    lambda pk=task.object_id: bump_auth_version(pk))
+            task.delete()
+        return len(tasks)
+
+    def fail(self, task, error):
+        self.stderr.write(TASK_FAILED.format(task=task, error=error))
+        task.attempts += 1
+        if task.attempts >= MAX_ATTEMPTS:
+            task.delete()
+        else:
+            task.save(update_fields=['attempts'])
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.feeds import rebuild_feeds
+
+
+REBUILT = 'Ленты подписок пересобраны, записей: {count}.'
+
+
+class Command(BaseCommand):
+    """
+    Команда на пересборку лент подписок: после массовых операций
+    в обход сигналов и после изменения FEED_PULL_SUBSCRIBERS.
+    """
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        self.stdout.write(REBUILT.format(count=rebuild_feeds()))
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import RecipeIngridients, ShoppingCartTotal
+
+
+BATCH_SIZE = 1000
+CHECK_FAILED = 'Расхождений в итогах списков покупок: {count}.'
+CHECK_PASSED = 'Итоги списков покупок совпадают с пересчетом.'
+REBUILT = 'Итоги списков покупок пересчитаны, записей: {count}.'
+
+
+def calculate_totals():
+    """Итоги Списков покупок, посчитанные заново по Рецептам."""
+    return {
+        (user_id, ingredient_id): amount
+        for user_id, ingredient_id, amount in RecipeIngridients.objects.filter(
+            recipe__shoppingcarts__isnull=False
+        ).values_list(
+            'recipe__shoppingcarts__user', 'ingredient'
+        ).annotate(Sum('amount')).order_by().iterator()
+    }
+
+
+class Command(BaseCommand):
+    """
+    Команда на пересчет итогов Списков покупок.
+    С --check только сверяет сохраненные итоги с пересчетом.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить итоги, не изменяя их.'
+        )
+
+    def handle(self, *args, **options):
+        totals = calculate_totals()
+        if options['check']:
+            stored = {
+                (user_id, ingredient_id): amount
+                for user_id, ingredient_id, amount
+                in ShoppingCartTotal.objects.values_list(
+                    'user', 'ingredient', 'amount').iterator()
+            }
+            mismatches = sum(
+                totals.get(key) != stored.get(key)
+                for key in {*totals, *stored}
+            )
+            if mismatches:
+                raise CommandError(CHECK_FAILED.format(count=mismatches))
+            self.stdout.write(CHECK_PASSED)
+            return
+        with transaction.atomic():
+            ShoppingCartTotal.objects.all().delete()
+            ShoppingCartTotal.objects.bulk_create(
+                (
+                    ShoppingCartTotal(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        amount=amount
+                    )
+                    for (user_id, ingredient_id), amount in totals.items()
+                ),
+                batch_size=BATCH_SIZE
+            )
+        self.stdout.write(REBUILT.format(count=len(totals)))
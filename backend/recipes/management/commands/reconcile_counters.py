@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.counters import reconcile_counters
+
+
+CHECK_FAILED = 'Расхождений в счетчиках: {count}.'
+CHECK_PASSED = 'Счетчики совпадают с пересчетом.'
+RECONCILED = 'Счетчик {counter}: исправлено записей: {count}.'
+
+
+class Command(BaseCommand):
+    """
+    Команда на пересчет счетчиков Рецептов и Пользователей
+    (Избранное, Списки покупок, подписки, рецепты автора).
+    С --check только сверяет счетчики с пересчетом.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить счетчики, не изменяя их.'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            fixed = reconcile_counters()
+            if options['check']:
+                transaction.set_rollback(True)
+        if options['check']:
+            count = sum(fixed.values())
+            if count:
+                raise CommandError(CHECK_FAILED.format(count=count))
+            self.stdout.write(CHECK_PASSED)
+            return
+        for counter, count in fixed.items():
+            self.stdout.write(RECONCILED.format(counter=counter, count=count))
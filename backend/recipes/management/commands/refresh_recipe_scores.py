@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import refresh_scores
+
+
+REFRESHED = 'Популярность пересчитана, исправлено рецептов: {count}.'
+
+
+class Command(BaseCommand):
+    """
+    Команда на пересчет популярности Рецептов по Избранному и Спискам
+    покупок. Сигналы поддерживают ее при каждом добавлении и удалении,
+    а затухание не требует пересчета со временем; команда исправляет
+    расхождения после массовых операций и ошибку округления, ее можно
+    запускать периодически (например, раз в сутки).
+    """
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        self.stdout.write(REFRESHED.format(count=refresh_scores()))
@@ -0,0 +1,244 @@
+import random
+from io import BytesIO
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from PIL import Image
+
+from recipes.catalog import invalidate_catalog
+from recipes.filters import CookingTimeFilter
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngridients,
+    ShoppingCart,
+    Subscription,
+    Tag,
+    User,
+)
+from recipes.short_links import invalidate_recipe_ids
+from recipes.versions import AUTHORS_VERSION_KEY, bump_version
+
+
+BATCH_SIZE = 2000
+# Показатель закона Ципфа: чем больше, тем сильнее перекос популярности.
+SKEW = 1.1
+PASSWORD = 'benchmark-password'
+UNITS = ('г', 'мл', 'шт.', 'ст. л.', 'ч. л.', 'по вкусу')
+TAGS = (
+    ('Завтрак', 'breakfast'),
+    ('Обед', 'lunch'),
+    ('Ужин', 'dinner'),
+    ('Десерт', 'dessert'),
+    ('Выпечка', 'bakery'),
+)
+CREATED = ('Создано: пользователей {users}, рецептов {recipes}, '
+           'продуктов в рецептах {ingredients}, избранного {favorites}, '
+           'списков покупок {carts}, подписок {subscriptions}.')
+
+
+class Skewed:
+    """
+    Случайный выбор из последовательности с перекосом по закону Ципфа:
+    первые элементы выбираются намного чаще последних.
+    """
+
+    def __init__(self, items, skew=SKEW):
+        self.items = list(items)
+        self.cum_weights = list(accumulate(
+            1 / rank ** skew for rank in range(1, len(self.items) + 1)
+        ))
+
+    def choices(self, k):
+        return random.choices(self.items, cum_weights=self.cum_weights, k=k)
+
+
+def get_last_id(model):
+    return model.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+
+
+def get_new_ids(model, last_id):
+    """
+    id записей, созданных после last_id: SQLite не возвращает id
+    из bulk_create.
+    """
+    return list(model.objects.filter(id__gt=last_id).order_by(
+        'id').values_list('id', flat=True))
+
+
+def make_image():
+    buffer = BytesIO()
+    Image.new('RGB', (600, 400), 'orange').save(buffer, 'JPEG')
+    return ContentFile(buffer.getvalue(), name='benchmark.jpg')
+
+
+class Command(BaseCommand):
+    """
+    Команда на заполнение базы данными для нагрузочных замеров.
+    Записи создаются пачками bulk_create; авторы, Рецепты и Продукты
+    популярны неравномерно, как в реальном трафике.
+    """
+
+    def add_arguments(self, parser):
+        for name, default, help_text in (
+            ('users', 1000, 'Число пользователей.'),
+            ('recipes', 10000, 'Число рецептов.'),
+            ('ingredients-per-recipe', 8, 'Продуктов в рецепте.'),
+            ('favorites', 50000, 'Число записей в избранном.'),
+            ('carts', 5000, 'Число записей в списках покупок.'),
+            ('subscriptions', 20000, 'Число подписок.'),
+            ('catalog-ingredients', 2000,
+             'Сколько продуктов создать, если каталог пуст.'),
+            ('seed', 1, 'Начальное значение генератора случайных чисел.'),
+        ):
+            parser.add_argument(
+                f'--{name}', type=int, default=default, help=help_text)
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        tags = self.get_tags()
+        ingredients = self.get_ingredients(options['catalog_ingredients'])
+        users = self.create_users(options['users'])
+        recipes = self.create_recipes(
+            options['recipes'], Skewed(users), tags)
+        recipe_ingredients = self.create_recipe_ingredients(
+            recipes, Skewed(ingredients), options['ingredients_per_recipe'])
+        popular_recipes = Skewed(recipes)
+        favorites = self.create_user_recipes(
+            Favorite, options['favorites'], users, popular_recipes)
+        carts = self.create_user_recipes(
+            ShoppingCart, options['carts'], users, popular_recipes)
+        subscriptions = self.create_subscriptions(
+            options['subscriptions'], users)
+        call_command('rebuild_shopping_cart_totals', stdout=self.stdout)
+        call_command('reconcile_counters', stdout=self.stdout)
+        call_command('refresh_recipe_scores', stdout=self.stdout)
+        call_command('rebuild_feeds', stdout=self.stdout)
+        transaction.on_commit(invalidate_catalog)
+        transaction.on_commit(invalidate_recipe_ids)
+        transaction.on_commit(CookingTimeFilter.invalidate)
+        transaction.on_commit(lambda: bump_version(AUTHORS_VERSION_KEY))
+        self.stdout.write(CREATED.format(
+            users=len(users),
+            recipes=len(recipes),
+            ingredients=recipe_ingredients,
+            favorites=favorites,
+            carts=carts,
+            subscriptions=subscriptions,
+        ))
+
+    def get_tags(self):
+        Tag.objects.bulk_create(
+            (Tag(name=name, slug=slug) for name, slug in TAGS),
+            ignore_conflicts=True
+        )
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def get_ingredients(self, count):
+        if not Ingredient.objects.exists():
+            Ingredient.objects.bulk_create(
+                (
+                    Ingredient(
+                        name=f'продукт {number}',
+                        measurement_unit=random.choice(UNITS)
+                    )
+                    for number in range(count)
+                ),
+                batch_size=BATCH_SIZE
+            )
+        return list(Ingredient.objects.values_list('id', flat=True))
+
+    def create_users(self, count):
+        start = User.objects.count()
+        last_id = get_last_id(User)
+        password = make_password(PASSWORD)
+        User.objects.bulk_create(
+            (
+                User(
+                    username=f'bench{number}',
+                    email=f'bench{number}@example.com',
+                    first_name='Имя',
+                    last_name='Фамилия',
+                    password=password,
+                )
+                for number in range(start, start + count)
+            ),
+            batch_size=BATCH_SIZE
+        )
+        return get_new_ids(User, last_id)
+
+    def create_recipes(self, count, authors, tags):
+        image = Recipe._meta.get_field('image')
+        image_name = image.storage.save(
+            image.generate_filename(None, 'benchmark.jpg'), make_image())
+        last_id = get_last_id(Recipe)
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author_id=author_id,
+                    name=f'Рецепт {number}',
+                    image=image_name,
+                    text='Описание рецепта для нагрузочных замеров.',
+                    cooking_time=random.randint(5, 180),
+                )
+                for number, author_id in enumerate(authors.choices(count))
+            ),
+            batch_size=BATCH_SIZE
+        )
+        recipes = get_new_ids(Recipe, last_id)
+        Recipe.tags.through.objects.bulk_create(
+            (
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in recipes
+                for tag_id in random.sample(tags, random.randint(1, 2))
+            ),
+            batch_size=BATCH_SIZE
+        )
+        return recipes
+
+    def create_recipe_ingredients(self, recipes, ingredients, count):
+        return len(RecipeIngridients.objects.bulk_create(
+            (
+                RecipeIngridients(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=random.randint(1, 500),
+                )
+                for recipe_id in recipes
+                for ingredient_id in set(ingredients.choices(count))
+            ),
+            batch_size=BATCH_SIZE
+        ))
+
+    def create_user_recipes(self, model, count, users, recipes):
+        pairs = set(
+            zip(random.choices(users, k=count), recipes.choices(count)))
+        model.objects.bulk_create(
+            (model(user_id=user, recipe_id=recipe) for user, recipe in pairs),
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True
+        )
+        return len(pairs)
+
+    def create_subscriptions(self, count, users):
+        authors = Skewed(users)
+        pairs = {
+            (user, author)
+            for user, author in zip(
+                random.choices(users, k=count), authors.choices(count))
+            if user != author
+        }
+        Subscription.objects.bulk_create(
+            (Subscription(user_id=user, author_id=author)
+             for user, author in pairs),
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True
+        )
+        return len(pairs)
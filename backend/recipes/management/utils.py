@@ -1,16 +1,288 @@
+import csv
 import json
+import os
+import re
+import time
+from itertools import islice
 
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
 
-SOME_ERROR = ('При загрузке данных в модель {model} из {path} '
-              'возникла ошибка: {error}')
+from config.settings import BASE_DIR
+from recipes.catalog import invalidate_catalog
 
 
-def load_from_json(model, path):
-    try:
-        with open(path, 'r', encoding='utf-8') as json_file:
-            model.objects.bulk_create(
-                (model(**line) for line in json.load(json_file)),
-                ignore_conflicts=True
+BATCH_SIZE = 1000
+JSON_CHUNK_SIZE = 64 * 1024
+JSON_MAX_ITEM_SIZE = 1024 * 1024
+JSON_SEPARATORS = re.compile(r'[\s,]*')
+FORMATS = ('csv', 'json', 'jsonl')
+
+FILE_ERROR = 'Не удалось прочитать {path}: {error}'
+FORMAT_ERROR = 'Неизвестный формат файла {path}, укажите --format.'
+JSON_ARRAY_ERROR = 'Ожидался JSON-массив объектов.'
+JSON_ITEM_ERROR = 'Некорректный JSON после {count} записей.'
+ROW_ERROR = 'Запись {number}: ожидались поля {fields}, получено {row}.'
+BATCH_ERROR = 'Ошибка при записи строк {start}-{end}: {error}'
+BATCH_REPORT = 'Строк: {rows}, {rate:.0f} строк/с.'
+REPORT = ('{model}: обработано строк {rows} за {seconds:.1f} с '
+          '({rate:.0f} строк/с), добавлено {created}, обновлено {updated}, '
+          'конфликтов {conflicts}.')
+
+
+def read_csv(file, fields):
+    """Строки CSV без заголовка (или с заголовком из названий полей)."""
+    reader = csv.reader(file)
+    for row in reader:
+        if reader.line_num == 1 and tuple(row) == fields:
+            continue
+        yield dict(zip(fields, row)) if len(row) == len(fields) else row
+
+
+def read_json(file, fields):
+    """
+    Объекты JSON-массива по одному: файл читается частями
+    и разбирается JSONDecoder.raw_decode без загрузки целиком.
+    """
+    decoder = json.JSONDecoder()
+    buffer = file.read(JSON_CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError(JSON_ARRAY_ERROR)
+    position = 1
+    count = 0
+    end_of_file = False
+    while True:
+        position = JSON_SEPARATORS.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if end_of_file or len(buffer) - position > JSON_MAX_ITEM_SIZE:
+                raise CommandError(JSON_ITEM_ERROR.format(count=count))
+            chunk = file.read(JSON_CHUNK_SIZE)
+            end_of_file = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        count += 1
+        yield item
+
+
+def read_jsonl(file, fields):
+    """Объекты JSON Lines, по одному на строку."""
+    for number, line in enumerate(file, 1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                raise CommandError(JSON_ITEM_ERROR.format(count=number - 1))
+
+
+READERS = {'csv': read_csv, 'json': read_json, 'jsonl': read_jsonl}
+
+
+class Importer:
+    """
+    Загрузка записей модели пачками: каждая пачка пишется в своей
+    транзакции. Записи с уже существующим ключом key_fields считаются
+    конфликтами; с update существующие записи, найденные
+    по lookup_field, обновляются по полям update_fields.
+    """
+
+    def __init__(self, model, fields, key_fields, lookup_field,
+                 update_fields, batch_size=BATCH_SIZE, update=False):
+        self.model = model
+        self.fields = fields
+        self.key_fields = key_fields
+        self.lookup_field = lookup_field
+        self.update_fields = update_fields
+        self.batch_size = batch_size
+        self.update = update
+        self.rows = self.created = self.updated = self.conflicts = 0
+
+    def validate(self, row):
+        self.rows += 1
+        if not isinstance(row, dict) or set(row) != set(self.fields):
+            raise CommandError(ROW_ERROR.format(
+                number=self.rows, fields=', '.join(self.fields), row=row))
+        return row
+
+    def run(self, rows, progress=None):
+        rows = (self.validate(row) for row in rows)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                return
+            start = self.rows - len(batch) + 1
+            try:
+                with transaction.atomic():
+                    self.write_batch(batch)
+            except DatabaseError as error:
+                raise CommandError(BATCH_ERROR.format(
+                    start=start, end=self.rows, error=error))
+            if progress:
+                progress()
+
+    def write_batch(self, batch):
+        """
+        Один запрос на поиск существующих записей пачки, затем
+        обновление измененных и вставка новых.
+        """
+        fields = [self.lookup_field, *self.key_fields, *self.update_fields]
+        existing = {}
+        lookups = {row[self.lookup_field] for row in batch}
+        for pk, *values in self.model.objects.filter(**{
+            f'{self.lookup_field}__in': lookups
+        }).values_list('pk', *fields).iterator():
+            existing.setdefault(values[0], []).append(
+                (pk, dict(zip(fields, values))))
+        keys = set()
+        to_create = []
+        to_update = {}
+        for row in batch:
+            key = tuple(row[field] for field in self.key_fields)
+            if key in keys:
+                self.conflicts += 1
+                continue
+            keys.add(key)
+            matches = existing.get(row[self.lookup_field], [])
+            same = [
+                (pk, values) for pk, values in matches
+                if tuple(values[field] for field in self.key_fields) == key
+            ]
+            if same or (self.update and len(matches) == 1):
+                pk, values = (same or matches)[0]
+                if not self.update or all(
+                    values[field] == row[field] for field in self.update_fields
+                ):
+                    self.conflicts += 1
+                    continue
+                to_update[pk] = self.model(pk=pk, **{
+                    field: row[field] for field in self.update_fields
+                })
+                continue
+            to_create.append(row)
+        if to_update:
+            self.model.objects.bulk_update(
+                to_update.values(), self.update_fields)
+        created = self.insert(to_create)
+        self.created += created
+        self.conflicts += len(to_create) - created
+        self.updated += len(to_update)
+
+    def insert(self, rows):
+        """
+        Вставка строк многострочными INSERT без создания объектов
+        модели; строки с существующим уникальным ключом пропускаются.
+        Возвращает число вставленных строк.
+        """
+        if not rows:
+            return 0
+        operations = connection.ops
+        fields = [self.model._meta.get_field(field) for field in self.fields]
+        sql = '{insert} {table} ({columns}) VALUES '.format(
+            insert=operations.insert_statement(ignore_conflicts=True),
+            table=operations.quote_name(self.model._meta.db_table),
+            columns=', '.join(
+                operations.quote_name(field.column) for field in fields),
+        )
+        placeholder = '({})'.format(', '.join(['%s'] * len(fields)))
+        suffix = operations.ignore_conflicts_suffix_sql(ignore_conflicts=True)
+        size = operations.bulk_batch_size(fields, rows)
+        inserted = 0
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), size):
+                part = rows[start:start + size]
+                cursor.execute(
+                    f'{sql}{", ".join([placeholder] * len(part))} {suffix}',
+                    [row[field] for row in part for field in self.fields]
+                )
+                inserted += cursor.rowcount
+        return inserted
+
+
+class ImportCommand(BaseCommand):
+    """
+    Базовая команда загрузки записей модели из CSV, JSON или JSON Lines.
+    Файл читается потоково, поэтому память не зависит от его размера.
+    """
+
+    model = None
+    filename = None
+    fields = None
+    key_fields = None
+    lookup_field = None
+    update_fields = None
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=os.path.join(BASE_DIR, 'data', self.filename),
+            help='Путь к файлу с данными.'
+        )
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='Формат файла (по умолчанию - по расширению).'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Число записей в одной транзакции.'
+        )
+        parser.add_argument(
+            '--update',
+            action='store_true',
+            help=(
+                'Обновлять существующие записи '
+                f'({", ".join(self.update_fields)}) '
+                f'по полю {self.lookup_field}.'
             )
-    except Exception as error:
-        print(SOME_ERROR.format(model=model, path=path, error=error))
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = (
+            options['format'] or os.path.splitext(path)[1].lstrip('.')
+        )
+        if file_format not in READERS:
+            raise CommandError(FORMAT_ERROR.format(path=path))
+        importer = Importer(
+            self.model,
+            self.fields,
+            self.key_fields,
+            self.lookup_field,
+            self.update_fields,
+            batch_size=options['batch_size'],
+            update=options['update'],
+        )
+        started = time.monotonic()
+
+        def progress():
+            if options['verbosity'] > 1:
+                self.stdout.write(BATCH_REPORT.format(
+                    rows=importer.rows,
+                    rate=importer.rows / (time.monotonic() - started)
+                ))
+
+        try:
+            with open(path, 'r', encoding='utf-8', newline='') as file:
+                importer.run(
+                    READERS[file_format](file, self.fields), progress)
+        except OSError as error:
+            raise CommandError(FILE_ERROR.format(path=path, error=error))
+        finally:
+            if importer.created or importer.updated:
+                invalidate_catalog()
+        seconds = time.monotonic() - started
+        self.stdout.write(REPORT.format(
+            model=self.model._meta.verbose_name_plural,
+            rows=importer.rows,
+            seconds=seconds,
+            rate=importer.rows / seconds if seconds else 0,
+            created=importer.created,
+            updated=importer.updated,
+            conflicts=importer.conflicts,
+        ))
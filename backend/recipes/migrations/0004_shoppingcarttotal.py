@@ -0,0 +1,54 @@
+# Generated by Django 3.2.3 on 2026-10-18 08:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_shoppingcart_totals(apps, schema_editor):
+    RecipeIngridients = apps.get_model('recipes', 'RecipeIngridients')
+    ShoppingCartTotal = apps.get_model('recipes', 'ShoppingCartTotal')
+    ShoppingCartTotal.objects.bulk_create(
+        (
+            ShoppingCartTotal(
+                user_id=user_id, ingredient_id=ingredient_id, amount=amount)
+            for user_id, ingredient_id, amount
+            in RecipeIngridients.objects.filter(
+                recipe__shoppingcarts__isnull=False
+            ).values_list(
+                'recipe__shoppingcarts__user', 'ingredient'
+            ).annotate(models.Sum('amount')).order_by().iterator()
+        ),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_alter_recipe_cooking_time'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingCartTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField(verbose_name='Мера')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shoppingcart_totals', to='recipes.ingredient', verbose_name='Продукт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shoppingcart_totals', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Итог списка покупок',
+                'verbose_name_plural': 'Итоги списков покупок',
+                'default_related_name': 'shoppingcart_totals',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcarttotal',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shoppingcart_total'),
+        ),
+        migrations.RunPython(
+            fill_shoppingcart_totals, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,18 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Расширение pg_trgm для поиска Продуктов по похожему названию.
+    Триграммные индексы объявлены в Meta.indexes Продукта (0016).
+    На других СУБД миграция ничего не делает.
+    """
+
+    dependencies = [
+        ('recipes', '0004_shoppingcarttotal'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+    ]
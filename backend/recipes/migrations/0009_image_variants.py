@@ -0,0 +1,64 @@
+# Generated by Django 3.2.3 on 2026-10-18 09:06
+
+from django.db import migrations, models
+
+
+def enqueue_existing_images(apps, schema_editor):
+    ImageTask = apps.get_model('recipes', 'ImageTask')
+    for model, image_field in (('recipe', 'image'), ('user', 'avatar')):
+        ImageTask.objects.bulk_create(
+            (
+                ImageTask(
+                    model=f'recipes.{model}', object_id=object_id, image=image)
+                for object_id, image in apps.get_model(
+                    'recipes', model
+                ).objects.filter(
+                    **{f'{image_field}__gt': ''}
+                ).values_list('id', image_field).iterator()
+            ),
+            batch_size=1000,
+            ignore_conflicts=True
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=64, verbose_name='Модель')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='ID объекта')),
+                ('image', models.CharField(max_length=255, verbose_name='Изображение')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попытки')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Задача обработки изображения',
+                'verbose_name_plural': 'Задачи обработки изображений',
+                'ordering': ('id',),
+            },
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Варианты фото'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='avatar_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Варианты аватарки'),
+        ),
+        migrations.AddConstraint(
+            model_name='imagetask',
+            constraint=models.UniqueConstraint(fields=('model', 'object_id', 'image'), name='unique_image_task'),
+        ),
+        migrations.RunPython(
+            enqueue_existing_images, migrations.RunPython.noop
+        ),
+    ]
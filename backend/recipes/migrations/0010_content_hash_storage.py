@@ -0,0 +1,24 @@
+# Generated by Django 3.2.3 on 2026-10-18 09:07
+
+from django.db import migrations, models
+import recipes.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(storage=recipes.storage.ContentHashStorage(), upload_to='recipes_images/', verbose_name='Фото блюда'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='avatar',
+            field=models.ImageField(blank=True, null=True, storage=recipes.storage.ContentHashStorage(), upload_to='users_avatars/', verbose_name='Аватар'),
+        ),
+    ]
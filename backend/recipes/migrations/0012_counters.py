@@ -0,0 +1,66 @@
+# Generated by Django 3.2.3 on 2026-10-18 10:05
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+COUNTERS = (
+    ('favorite', 'recipe', 'recipe', 'favorites_count'),
+    ('shoppingcart', 'recipe', 'recipe', 'shopping_carts_count'),
+    ('subscription', 'user', 'user', 'subscriptions_count'),
+    ('subscription', 'author', 'user', 'subscribers_count'),
+    ('recipe', 'author', 'user', 'recipes_count'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for related_name, field, model_name, counter in COUNTERS:
+        related_model = apps.get_model('recipes', related_name)
+        apps.get_model('recipes', model_name).objects.update(**{
+            counter: Coalesce(
+                Subquery(
+                    related_model.objects.filter(
+                        **{field: OuterRef('pk')}
+                    ).order_by().values(field).annotate(
+                        count=Count('pk')).values('count')
+                ),
+                0
+            )
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_cooking_time_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Рецептов'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='subscribers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Подписчиков'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='subscriptions_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Подписок'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В Избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='shopping_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В Списках покупок'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 3.2.3 on 2026-10-18 10:40
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+SCORE_WEIGHTS = (('favorite', 2), ('shoppingcart', 1))
+TRENDING_EPOCH = datetime(2024, 1, 1, tzinfo=django.utils.timezone.utc)
+TRENDING_HALF_LIFE = timedelta(days=7)
+
+
+def fill_scores(apps, schema_editor):
+    """
+    Время уже существующих добавлений неизвестно: берется дата
+    публикации Рецепта. По нему считается популярность Рецептов.
+    """
+    recipe_model = apps.get_model('recipes', 'recipe')
+    scores = defaultdict(lambda: [0, 0.0])
+    for model_name, weight in SCORE_WEIGHTS:
+        model = apps.get_model('recipes', model_name)
+        model.objects.update(created_at=Subquery(
+            recipe_model.objects.filter(
+                pk=OuterRef('recipe')).values('pub_date')
+        ))
+        for recipe_id, created_at in model.objects.values_list(
+            'recipe', 'created_at'
+        ).iterator():
+            score = scores[recipe_id]
+            score[0] += weight
+            score[1] += weight * 2 ** (
+                (created_at - TRENDING_EPOCH) / TRENDING_HALF_LIFE)
+    recipes = []
+    for recipe_id, (popularity, trending) in scores.items():
+        recipes.append(recipe_model(
+            pk=recipe_id, popularity=popularity, trending=trending))
+    recipe_model.objects.bulk_update(
+        recipes, ('popularity', 'trending'), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favorite',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='popularity',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Популярность'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='trending',
+            field=models.FloatField(default=0, editable=False, verbose_name='Популярность с затуханием'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-popularity', '-id'], name='recipe_popularity_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-trending', '-id'], name='recipe_trending_id_idx'),
+        ),
+        migrations.RunPython(fill_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 3.2.3 on 2026-10-18 11:20
+
+from itertools import islice
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BATCH_SIZE = 1000
+
+
+def fill_feeds(apps, schema_editor):
+    user_model = apps.get_model('recipes', 'user')
+    feed_entry_model = apps.get_model('recipes', 'feedentry')
+    user_model.objects.filter(
+        subscribers_count__gt=settings.FEED_PULL_SUBSCRIBERS
+    ).update(feed_pull=True)
+    entries = apps.get_model('recipes', 'subscription').objects.filter(
+        author__feed_pull=False, author__recipes__isnull=False
+    ).values_list(
+        'user', 'author__recipes', 'author__recipes__pub_date'
+    ).order_by().iterator()
+    batch = list(islice(entries, BATCH_SIZE))
+    while batch:
+        feed_entry_model.objects.bulk_create(
+            [
+                feed_entry_model(
+                    user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+                for user_id, recipe_id, pub_date in batch
+            ],
+            ignore_conflicts=True
+        )
+        batch = list(islice(entries, BATCH_SIZE))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_scores'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='feed_pull',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Рецепты в ленты при чтении'),
+        ),
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='recipes.recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Записи лент',
+                'default_related_name': 'feed_entries',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', '-pub_date', '-recipe'], name='feed_entry_user_pub_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feedentry',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_feed_entry'),
+        ),
+        migrations.RunPython(fill_feeds, migrations.RunPython.noop),
+    ]
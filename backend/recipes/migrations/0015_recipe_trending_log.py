@@ -0,0 +1,39 @@
+# Generated by Django 3.2.3 on 2026-10-18 10:00
+
+from math import log
+
+from django.db import migrations, models
+from django.db.models.functions import Ln, Power
+
+
+TRENDING_EMPTY = -10.0 ** 9
+
+
+def trending_to_log(apps, schema_editor):
+    """Популярность с затуханием хранится двоичным логарифмом суммы."""
+    recipes = apps.get_model('recipes', 'recipe').objects
+    recipes.filter(trending__lte=0).update(trending=TRENDING_EMPTY)
+    recipes.filter(trending__gt=0).update(trending=Ln('trending') / log(2))
+
+
+def trending_from_log(apps, schema_editor):
+    recipes = apps.get_model('recipes', 'recipe').objects
+    recipes.exclude(trending=TRENDING_EMPTY).update(
+        trending=Power(2.0, 'trending'))
+    recipes.filter(trending=TRENDING_EMPTY).update(trending=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_feedentry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='trending',
+            field=models.FloatField(default=-1000000000.0, editable=False, verbose_name='Популярность с затуханием'),
+        ),
+        migrations.RunPython(trending_to_log, trending_from_log),
+    ]
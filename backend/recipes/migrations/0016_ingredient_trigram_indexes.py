@@ -0,0 +1,35 @@
+# Generated by Django 3.2.3 on 2026-10-18 10:03
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+import django.db.models.functions.text
+import recipes.models
+
+
+class Migration(migrations.Migration):
+    """
+    Триграммные индексы из Meta.indexes вместо созданных SQL-запросами
+    прежней версии 0005: те удаляются, если есть.
+    """
+
+    dependencies = [
+        ('recipes', '0015_recipe_trending_log'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            [
+                'DROP INDEX IF EXISTS recipes_ingredient_name_trgm',
+                'DROP INDEX IF EXISTS recipes_ingredient_name_upper_trgm',
+            ],
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=recipes.models.TrigramIndex(fields=['name'], name='ingredient_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=recipes.models.TrigramIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='ingredient_upper_name_trgm_idx'),
+        ),
+    ]
@@ -1,6 +1,11 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import TrigramSimilarity
 from django.core.validators import MinValueValidator, RegexValidator
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models.functions import Upper
+
+from .storage import content_hash_storage
 
 
 TAG_HELP_TEXT = 'Выберите один или несколько тегов.'
@@ -8,9 +13,36 @@ INGREDIENT_HELP_TEXT = 'Укажите необходимые продукты.'
 DESCRIPTION_LENGTH_LIMIT = 20
 MIN_AMOUNT = 1
 MIN_COOKING_TIME = 1
+# Популярность с затуханием Рецепта без добавлений (см. counters).
+TRENDING_EMPTY = -10.0 ** 9
+
+
+class CountersModel(models.Model):
+    """
+    Базовый класс моделей со счетчиками и признаками counter_fields:
+    их меняют только запросы UPDATE (см. counters и feeds). save()
+    существующей записи их не пишет, иначе значения загруженного раньше
+    экземпляра затерли бы изменения, сделанные после его загрузки.
+    """
+
+    counter_fields = ()
+
+    class Meta:
+        abstract = True
 
+    def save(self, *args, update_fields=None, **kwargs):
+        if update_fields is None and not self._state.adding:
+            deferred_fields = self.get_deferred_fields()
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.attname not in deferred_fields
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, update_fields=update_fields, **kwargs)
 
-class User(AbstractUser):
+
+class User(CountersModel, AbstractUser):
     """Модель Пользователя."""
 
     first_name = models.CharField('Имя', max_length=150)
@@ -19,18 +51,39 @@ class User(AbstractUser):
     avatar = models.ImageField(
         'Аватар',
         upload_to='users_avatars/',
+        storage=content_hash_storage,
         blank=True,
         null=True
     )
+    avatar_variants = models.JSONField(
+        'Варианты аватарки',
+        default=dict,
+        blank=True,
+        editable=False
+    )
     username = models.CharField(
         'Псевдоним',
         max_length=150,
         unique=True,
         validators=[RegexValidator(regex=r'^[\w.@+-]+\Z')]
     )
+    recipes_count = models.PositiveIntegerField(
+        'Рецептов', default=0, editable=False)
+    subscribers_count = models.PositiveIntegerField(
+        'Подписчиков', default=0, editable=False)
+    subscriptions_count = models.PositiveIntegerField(
+        'Подписок', default=0, editable=False)
+    feed_pull = models.BooleanField(
+        'Рецепты в ленты при чтении', default=False, editable=False)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('first_name', 'last_name', 'username')
+    counter_fields = (
+        'recipes_count',
+        'subscribers_count',
+        'subscriptions_count',
+        'feed_pull',
+    )
 
     class Meta:
         verbose_name = 'Пользователь'
@@ -98,12 +151,57 @@ class Tag(models.Model):
         return f'{self.name}'
 
 
+class TrigramIndex(GinIndex):
+    """
+    GIN-индекс по триграммам (pg_trgm) для поиска по подстроке и похожести.
+    На других СУБД не создается: поиск там идет без него.
+    """
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return ''
+        return super().create_sql(model, schema_editor, using, **kwargs)
+
+    def remove_sql(self, model, schema_editor, **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return ''
+        return super().remove_sql(model, schema_editor, **kwargs)
+
+
+class IngredientQuerySet(models.QuerySet):
+    """Запросы к Продуктам."""
+
+    def search(self, name):
+        """
+        Поиск по названию: сначала Продукты, название которых начинается
+        с name, затем содержащие name, затем похожие (только PostgreSQL).
+        """
+        condition = models.Q(name__icontains=name)
+        order = ['search_rank']
+        ingredients = self
+        if connection.vendor == 'postgresql':
+            condition |= models.Q(name__trigram_similar=name)
+            ingredients = ingredients.annotate(
+                similarity=TrigramSimilarity('name', name))
+            order.append('-similarity')
+        return ingredients.filter(condition).annotate(
+            search_rank=models.Case(
+                models.When(name__istartswith=name, then=0),
+                models.When(name__icontains=name, then=1),
+                default=2,
+                output_field=models.IntegerField(),
+            )
+        ).order_by(*order, 'name')
+
+
 class Ingredient(models.Model):
     """Модель Продукта."""
 
     name = models.CharField('Название', max_length=128, db_index=True,)
     measurement_unit = models.CharField('Единица измерения', max_length=64,)
 
+    objects = IngredientQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Продукт'
         verbose_name_plural = 'Продукты'
@@ -114,13 +212,57 @@ class Ingredient(models.Model):
                 name='unique_ingredient_measurement_unit',
             )
         ]
+        # Поиск Продуктов по подстроке (icontains сравнивает UPPER)
+        # и по похожему названию.
+        indexes = [
+            TrigramIndex(
+                fields=['name'],
+                opclasses=['gin_trgm_ops'],
+                name='ingredient_name_trgm_idx'
+            ),
+            TrigramIndex(
+                OpClass(Upper('name'), name='gin_trgm_ops'),
+                name='ingredient_upper_name_trgm_idx'
+            ),
+        ]
 
     def __str__(self):
         return (f'{self.name[:DESCRIPTION_LENGTH_LIMIT]} '
                 f'({self.measurement_unit})')
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    """Запросы к Рецептам."""
+
+    def with_user_flags(self, user):
+        """
+        Признаки избранного, списка покупок и подписки на автора
+        вычисляются подзапросами EXISTS в основном запросе.
+        """
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=models.Value(False),
+                is_in_shopping_cart=models.Value(False),
+                is_author_subscribed=models.Value(False),
+            )
+        return self.annotate(
+            is_favorited=models.Exists(Favorite.objects.filter(
+                user=user, recipe=models.OuterRef('pk'))),
+            is_in_shopping_cart=models.Exists(ShoppingCart.objects.filter(
+                user=user, recipe=models.OuterRef('pk'))),
+            is_author_subscribed=models.Exists(Subscription.objects.filter(
+                user=user, author=models.OuterRef('author'))),
+        )
+
+    def for_reading(self, user):
+        """Рецепты со всеми данными для чтения за постоянное число запросов."""
+        return self.select_related('author').prefetch_related(
+            'tags',
+            'recipe_ingridients__ingredient',
+        ).with_user_flags(user)
+
+
+class Recipe(CountersModel):
     """Модель Рецепта."""
 
     author = models.ForeignKey(
@@ -130,7 +272,17 @@ class Recipe(models.Model):
         verbose_name='Автор',
     )
     name = models.CharField('Название', max_length=256,)
-    image = models.ImageField('Фото блюда', upload_to='recipes_images/',)
+    image = models.ImageField(
+        'Фото блюда',
+        upload_to='recipes_images/',
+        storage=content_hash_storage,
+    )
+    image_variants = models.JSONField(
+        'Варианты фото',
+        default=dict,
+        blank=True,
+        editable=False
+    )
     text = models.TextField('Описание',)
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -147,13 +299,53 @@ class Recipe(models.Model):
         'Время (мин)',
         validators=[MinValueValidator(MIN_COOKING_TIME)],
     )
+    favorites_count = models.PositiveIntegerField(
+        'В Избранном', default=0, editable=False)
+    shopping_carts_count = models.PositiveIntegerField(
+        'В Списках покупок', default=0, editable=False)
+    popularity = models.PositiveIntegerField(
+        'Популярность', default=0, editable=False)
+    trending = models.FloatField(
+        'Популярность с затуханием', default=TRENDING_EMPTY, editable=False)
     pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
+
+    objects = RecipeQuerySet.as_manager()
+
+    counter_fields = (
+        'favorites_count', 'shopping_carts_count', 'popularity', 'trending')
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         default_related_name = 'recipes'
         ordering = ('-pub_date', 'name')
+        indexes = [
+            models.Index(
+                fields=['-pub_date', 'name'],
+                name='recipe_pub_date_name_idx'
+            ),
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='recipe_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['cooking_time'],
+                name='recipe_cooking_time_idx'
+            ),
+            models.Index(
+                fields=['-popularity', '-id'],
+                name='recipe_popularity_id_idx'
+            ),
+            models.Index(
+                fields=['-trending', '-id'],
+                name='recipe_trending_id_idx'
+            ),
+        ]
 
     def __str__(self):
         return (
@@ -161,6 +353,45 @@ class Recipe(models.Model):
             f'{self.cooking_time} мин. - {self.author}'
         )
 
+    def get_ingredient_amounts(self):
+        """Меры Продуктов Рецепта: {id Продукта: мера}."""
+        return dict(
+            self.recipe_ingridients.values_list('ingredient', 'amount'))
+
+    def set_ingredient_amounts(self, amounts):
+        """
+        Приводит Продукты Рецепта к мерам {id Продукта: мера}: меняются
+        только добавленные, измененные и убранные строки.
+        Возвращает прежние меры.
+        """
+        current = {
+            item.ingredient_id: item for item in self.recipe_ingridients.all()
+        }
+        old_amounts = {
+            ingredient_id: item.amount
+            for ingredient_id, item in current.items()
+        }
+        removed = []
+        changed = []
+        for ingredient_id, item in current.items():
+            if ingredient_id not in amounts:
+                removed.append(item.id)
+            elif amounts[ingredient_id] != item.amount:
+                item.amount = amounts[ingredient_id]
+                changed.append(item)
+        with transaction.atomic():
+            if removed:
+                RecipeIngridients.objects.filter(id__in=removed).delete()
+            if changed:
+                RecipeIngridients.objects.bulk_update(changed, ['amount'])
+            RecipeIngridients.objects.bulk_create(
+                RecipeIngridients(
+                    recipe=self, ingredient_id=ingredient_id, amount=amount)
+                for ingredient_id, amount in amounts.items()
+                if ingredient_id not in current
+            )
+        return old_amounts
+
 
 class RecipeIngridients(models.Model):
     """Продукты для Рецепта - промежуточная модель."""
@@ -206,6 +437,7 @@ class UserAndRecipeModel(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Рецепт',
     )
+    created_at = models.DateTimeField('Дата добавления', auto_now_add=True)
 
     class Meta:
         abstract = True
@@ -216,6 +448,12 @@ class UserAndRecipeModel(models.Model):
                 name='unique_users_%(class)s_records'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'],
+                name='%(class)s_recipe_user_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user}: {self.recipe}'
@@ -235,3 +473,159 @@ class ShoppingCart(UserAndRecipeModel):
     class Meta(UserAndRecipeModel.Meta):
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
+
+
+class ShoppingCartTotalQuerySet(models.QuerySet):
+    """Изменение итогов Списков покупок."""
+
+    def add_amounts(self, user_ids, amounts):
+        """Прибавляет к итогам пользователей меры {id Продукта: мера}."""
+        amounts = {
+            ingredient_id: amount
+            for ingredient_id, amount in amounts.items() if amount
+        }
+        if not user_ids or not amounts:
+            return
+        with transaction.atomic():
+            self.bulk_create(
+                (
+                    self.model(
+                        user_id=user_id, ingredient_id=ingredient_id, amount=0)
+                    for user_id in user_ids for ingredient_id in amounts
+                ),
+                ignore_conflicts=True
+            )
+            self.filter(user__in=user_ids, ingredient__in=amounts).update(
+                amount=models.F('amount') + models.Case(
+                    *(
+                        models.When(ingredient=ingredient_id, then=amount)
+                        for ingredient_id, amount in amounts.items()
+                    ),
+                    default=0
+                )
+            )
+            self.filter(user__in=user_ids, amount__lte=0).delete()
+
+    def add_recipe(self, user_id, recipe_id, factor=1):
+        """Добавляет (factor=-1 - убирает) Рецепт в итоги пользователя."""
+        self.add_amounts([user_id], {
+            ingredient_id: factor * amount
+            for ingredient_id, amount in RecipeIngridients.objects.filter(
+                recipe=recipe_id
+            ).values_list('ingredient', 'amount')
+        })
+
+    def change_recipe_amounts(self, recipe, old_amounts, new_amounts):
+        """Переносит изменение Продуктов Рецепта в списки покупок с ним."""
+        amounts = {
+            ingredient_id: (
+                new_amounts.get(ingredient_id, 0)
+                - old_amounts.get(ingredient_id, 0)
+            )
+            for ingredient_id in {*old_amounts, *new_amounts}
+        }
+        if not any(amounts.values()):
+            return
+        self.add_amounts(
+            list(recipe.shoppingcarts.values_list('user', flat=True)),
+            amounts
+        )
+
+
+class ShoppingCartTotal(models.Model):
+    """
+    Суммарная мера Продукта в Списке покупок пользователя.
+    Обновляется при изменении Списка покупок и Продуктов в Рецептах.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Продукт'
+    )
+    amount = models.IntegerField('Мера')
+
+    objects = ShoppingCartTotalQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Итог списка покупок'
+        verbose_name_plural = 'Итоги списков покупок'
+        default_related_name = 'shoppingcart_totals'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient', ],
+                name='unique_shoppingcart_total'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} - {self.amount}'
+
+
+class FeedEntry(models.Model):
+    """
+    Запись ленты подписок: Рецепт автора, на которого подписан
+    пользователь. Дата публикации копируется из Рецепта для сортировки
+    по индексу ленты.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+        default_related_name = 'feed_entries'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='feed_entry_user_pub_date_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.recipe}'
+
+
+class ImageTask(models.Model):
+    """Задача на подготовку вариантов изображения."""
+
+    model = models.CharField('Модель', max_length=64)
+    object_id = models.PositiveBigIntegerField('ID объекта')
+    image = models.CharField('Изображение', max_length=255)
+    attempts = models.PositiveSmallIntegerField('Попытки', default=0)
+    created_at = models.DateTimeField('Дата создания', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Задача обработки изображения'
+        verbose_name_plural = 'Задачи обработки изображений'
+        ordering = ('id',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['model', 'object_id', 'image'],
+                name='unique_image_task'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.model} {self.object_id}: {self.image}'
@@ -0,0 +1,28 @@
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class PrimaryKeyCountPaginator(Paginator):
+    """
+    Общее число объектов считается по первичным ключам: аннотации
+    выборки (флаги пользователя, счетчики и т.п.) в запрос подсчета
+    не попадают.
+    """
+
+    @cached_property
+    def count(self):
+        return self.object_list.values('pk').count()
+
+
+def after(position, value_field, id_field):
+    """
+    Условие пагинации по ключу при сортировке по убыванию (значение, id):
+    записи после position. Отдельное условие на значение дает границу
+    для поиска по индексу.
+    """
+    value, pk = position
+    return Q(**{f'{value_field}__lte': value}) & (
+        Q(**{f'{value_field}__lt': value})
+        | Q(**{value_field: value, f'{id_field}__lt': pk})
+    )
@@ -0,0 +1,114 @@
+from threading import Lock
+
+from .models import Recipe
+from .versions import RECIPES_VERSION_KEY, bump_version, get_version
+
+
+# Только буквы без похожих на цифры l и O: коды не пересекаются
+# со старыми ссылками вида /s/<id>/.
+ALPHABET = 'kQmTzRbWxLpHfNvYcJdGsKwEhUaXrMtZgPnVyBqFeDuCjSiAoI'
+BASE = len(ALPHABET)
+ALPHABET_INDEX = {char: index for index, char in enumerate(ALPHABET)}
+ID_BITS = 36
+ID_MASK = (1 << ID_BITS) - 1
+CODE_LENGTH = 7
+# Нечетный множитель перемешивает соседние id; это не шифрование,
+# а только непрозрачный вид ссылки.
+MULTIPLIER = 0x9E3779B1
+MULTIPLIER_INVERSE = pow(MULTIPLIER, -1, 1 << ID_BITS)
+XOR_MASK = 0x5A3C96E1D
+
+_recipe_ids = None
+_recipe_ids_lock = Lock()
+
+
+def encode(pk):
+    """Код короткой ссылки Рецепта: CODE_LENGTH букв."""
+    number = (int(pk) * MULTIPLIER & ID_MASK) ^ XOR_MASK
+    chars = []
+    for _ in range(CODE_LENGTH):
+        number, index = divmod(number, BASE)
+        chars.append(ALPHABET[index])
+    return ''.join(chars)
+
+
+def decode(code):
+    """id Рецепта по коду или None для некорректного кода."""
+    if len(code) != CODE_LENGTH:
+        return None
+    number = 0
+    for char in reversed(code):
+        index = ALPHABET_INDEX.get(char)
+        if index is None:
+            return None
+        number = number * BASE + index
+    if number > ID_MASK:
+        return None
+    return (number ^ XOR_MASK) * MULTIPLIER_INVERSE & ID_MASK
+
+
+class RecipeIds:
+    """
+    Битовая карта id существующих Рецептов в памяти процесса:
+    бит на id, около 125 КБ на миллион Рецептов.
+    """
+
+    def __init__(self, version):
+        self.version = version
+        ids = Recipe.objects.order_by('-id').values_list(
+            'id', flat=True).iterator()
+        last_id = next(ids, None)
+        self.bits = bytearray(0 if last_id is None else last_id // 8 + 1)
+        if last_id is not None:
+            self.add(last_id)
+        for pk in ids:
+            self.add(pk)
+
+    def add(self, pk):
+        if pk >> 3 >= len(self.bits):
+            self.bits.extend(bytes((pk >> 3) + 1 - len(self.bits)))
+        self.bits[pk >> 3] |= 1 << (pk & 7)
+
+    def __contains__(self, pk):
+        return (
+            0 <= pk >> 3 < len(self.bits)
+            and bool(self.bits[pk >> 3] & 1 << (pk & 7))
+        )
+
+
+def get_recipe_ids():
+    """
+    id Рецептов текущей версии; после удаления Рецепта карта
+    загружается заново одним запросом.
+    """
+    global _recipe_ids
+    version = get_version(RECIPES_VERSION_KEY)
+    if version is None:
+        return RecipeIds(version)
+    recipe_ids = _recipe_ids
+    if recipe_ids is not None and recipe_ids.version == version:
+        return recipe_ids
+    with _recipe_ids_lock:
+        if _recipe_ids is None or _recipe_ids.version != version:
+            _recipe_ids = RecipeIds(version)
+        return _recipe_ids
+
+
+def recipe_exists(pk):
+    """
+    Есть ли Рецепт с id pk. Новые Рецепты версию карты не меняют:
+    id, которого нет в карте, проверяется запросом по pk и при успехе
+    добавляется в карту процесса.
+    """
+    recipe_ids = get_recipe_ids()
+    if pk in recipe_ids:
+        return True
+    if not Recipe.objects.filter(pk=pk).exists():
+        return False
+    with _recipe_ids_lock:
+        recipe_ids.add(pk)
+    return True
+
+
+def invalidate_recipe_ids():
+    bump_version(RECIPES_VERSION_KEY)
@@ -0,0 +1,144 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .catalog import invalidate_catalog
+from .counters import change_counters
+from .feeds import add_subscription, push_recipe, remove_subscription
+from .filters import CookingTimeFilter
+from .images import IMAGE_FIELDS, get_variant_names
+from .models import (
+    Favorite,
+    ImageTask,
+    Ingredient,
+    Recipe,
+    ShoppingCart,
+    ShoppingCartTotal,
+    Subscription,
+    Tag,
+    User,
+)
+from .short_links import invalidate_recipe_ids
+from .versions import (
+    AUTHORS_VERSION_KEY,
+    RECIPES_LIST_VERSION_KEY,
+    bump_auth_version,
+    bump_user_state_version,
+    bump_version,
+)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_recipe_to_totals(sender, instance, created, **kwargs):
+    if created:
+        ShoppingCartTotal.objects.add_recipe(
+            instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_recipe_from_totals(sender, instance, **kwargs):
+    ShoppingCartTotal.objects.add_recipe(
+        instance.user_id, instance.recipe_id, factor=-1)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def change_catalog(sender, **kwargs):
+    transaction.on_commit(invalidate_catalog)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def change_recipes(sender, **kwargs):
+    transaction.on_commit(CookingTimeFilter.invalidate)
+    # Число рецептов в списках с фильтрами (api.views): автор и теги
+    # Рецепта меняются только с его сохранением.
+    transaction.on_commit(lambda: bump_version(RECIPES_LIST_VERSION_KEY))
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_recipe_id(sender, **kwargs):
+    # Новые id находит recipe_exists, удаленные убираются только
+    # перезагрузкой карты.
+    transaction.on_commit(invalidate_recipe_ids)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def change_user_state(sender, instance, **kwargs):
+    transaction.on_commit(
+        lambda: bump_user_state_version(instance.user_id))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+@receiver(post_save, sender=Recipe)
+def increase_counters(sender, instance, created, **kwargs):
+    if created:
+        change_counters(instance, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Subscription)
+@receiver(post_delete, sender=Recipe)
+def decrease_counters(sender, instance, **kwargs):
+    change_counters(instance, -1)
+
+
+@receiver(post_save, sender=Recipe)
+def push_recipe_to_feeds(sender, instance, created, **kwargs):
+    if created:
+        push_recipe(instance)
+
+
+@receiver(post_save, sender=Subscription)
+def add_author_to_feed(sender, instance, created, **kwargs):
+    if created:
+        add_subscription(instance)
+
+
+@receiver(post_delete, sender=Subscription)
+def remove_author_from_feed(sender, instance, **kwargs):
+    remove_subscription(instance)
+
+
+@receiver(post_save, sender=User)
+def change_author(sender, update_fields=None, **kwargs):
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        transaction.on_commit(lambda: bump_version(AUTHORS_VERSION_KEY))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def change_user_credentials(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        # После удаления pk экземпляра обнуляется до фиксации транзакции.
+        user_id = instance.pk
+        transaction.on_commit(lambda: bump_auth_version(user_id))
+
+
+@receiver(post_delete, sender=Token)
+def delete_token(sender, instance, **kwargs):
+    transaction.on_commit(lambda: bump_auth_version(instance.user_id))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def enqueue_image_variants(sender, instance, **kwargs):
+    model = instance._meta.label_lower
+    image_field, variants_field = IMAGE_FIELDS[model]
+    image = getattr(instance, image_field)
+    if image and getattr(instance, variants_field) != get_variant_names(
+        image.name
+    ):
+        ImageTask.objects.get_or_create(
+            model=model, object_id=instance.pk, image=image.name)
@@ -0,0 +1,41 @@
+import os
+from hashlib import sha256
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentHashStorage(FileSystemStorage):
+    """
+    Хранилище, в котором имя файла - хэш его содержимого.
+    Одинаковые файлы хранятся один раз, а повторная загрузка того же
+    содержимого ничего не записывает. Файл может использоваться
+    несколькими объектами, поэтому вместе с ними не удаляется:
+    неиспользуемые файлы удаляет команда collect_media_garbage.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        directory, file_name = os.path.split(name)
+        name = os.path.join(
+            directory,
+            digest.hexdigest() + os.path.splitext(file_name)[1].lower()
+        )
+        if self.exists(name):
+            try:
+                # Файл снова используется: collect_media_garbage не удаляет
+                # недавно измененные файлы, пока ссылка на него не сохранена.
+                os.utime(self.path(name))
+                return name
+            except FileNotFoundError:
+                pass
+        return super().save(name, content, max_length)
+
+
+content_hash_storage = ContentHashStorage()
@@ -0,0 +1,233 @@
+import os
+import shutil
+import tempfile
+from collections import Counter
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .filters import CookingTimeFilter
+from .images import get_variant_names
+from .short_links import encode, get_recipe_ids, recipe_exists
+from .storage import content_hash_storage
+from .models import FeedEntry, Recipe, Subscription, Tag, User
+
+
+class CookingTimeFilterTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='password',
+            first_name='Админ',
+            last_name='Админов',
+        )
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=cls.admin,
+                name=f'Рецепт {number}',
+                image='recipes_images/recipe.png',
+                text='Описание',
+                cooking_time=cooking_time,
+            )
+            for number, cooking_time in enumerate(
+                [1, 1, 5, 10, 10, 10, 15, 20, 30, 45, 60, 90, 120]
+            )
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:recipes_recipe_changelist')
+
+    def test_every_range_opens(self):
+        changelist = self.client.get(self.url).context['cl']
+        spec, = [
+            spec for spec in changelist.filter_specs
+            if isinstance(spec, CookingTimeFilter)
+        ]
+        ranges = spec.get_ranges(Recipe.objects.all())
+        self.assertEqual(len(ranges), CookingTimeFilter.ranges_number)
+        self.assertIsNone(ranges[-1][1])
+        choices = list(spec.choices(changelist))[1:]
+        self.assertEqual(len(choices), len(ranges))
+        for choice, (start, end, count) in zip(choices, ranges):
+            with self.subTest(choice['display']):
+                response = self.client.get(self.url + choice['query_string'])
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.context['cl'].result_count, count)
+
+
+class FeedTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin, cls.author, cls.new_author, cls.reader, cls.new_reader = (
+            User.objects.create_user(
+                username=username,
+                email=f'{username}@example.com',
+                password='password',
+                first_name='Имя',
+                last_name='Фамилия',
+                is_staff=username == 'admin',
+                is_superuser=username == 'admin',
+            )
+            for username in (
+                'admin', 'author', 'new_author', 'reader', 'new_reader')
+        )
+        Subscription.objects.create(user=cls.reader, author=cls.author)
+        Subscription.objects.create(
+            user=cls.new_reader, author=cls.new_author)
+        cls.recipe = Recipe.objects.create(
+            author=cls.author,
+            name='Рецепт',
+            image='recipes_images/recipe.png',
+            text='Описание',
+            cooking_time=10,
+        )
+        cls.recipe.tags.set([Tag.objects.create(name='Тег', slug='tag')])
+
+    def test_feed_pull_kept_on_save(self):
+        author = User.objects.get(pk=self.author.pk)
+        User.objects.filter(pk=author.pk).update(feed_pull=True)
+        author.avatar = None
+        author.save()
+        author.refresh_from_db()
+        self.assertTrue(author.feed_pull)
+
+    def test_admin_author_change_moves_recipe_between_feeds(self):
+        self.client.force_login(self.admin)
+        response = self.client.post(
+            reverse('admin:recipes_recipe_change', args=[self.recipe.pk]),
+            {
+                'name': self.recipe.name,
+                'cooking_time': self.recipe.cooking_time,
+                'author': self.new_author.pk,
+                'text': self.recipe.text,
+                'tags': list(self.recipe.tags.values_list('pk', flat=True)),
+                'recipe_ingridients-TOTAL_FORMS': 0,
+                'recipe_ingridients-INITIAL_FORMS': 0,
+            }
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            list(FeedEntry.objects.filter(
+                recipe=self.recipe).values_list('user', flat=True)),
+            [self.new_reader.pk]
+        )
+
+
+class MediaGarbageTest(TestCase):
+    """
+    Файл, на который сослались после подсчета ссылок, и повторно
+    загруженный файл не удаляются сборкой мусора.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='password',
+            first_name='Имя',
+            last_name='Фамилия',
+        )
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.name = content_hash_storage.save(
+            'recipes_images/recipe.png', ContentFile(b'image'))
+        self.variant = get_variant_names(self.name)['thumbnail']
+        default_storage.save(self.variant, ContentFile(b'variant'))
+        self.make_old(self.name)
+
+    @staticmethod
+    def make_old(name):
+        os.utime(content_hash_storage.path(name), (0, 0))
+
+    def test_upload_refreshes_modified_time(self):
+        self.assertEqual(
+            content_hash_storage.save(
+                'recipes_images/other.png', ContentFile(b'image')),
+            self.name
+        )
+        call_command('collect_media_garbage', stdout=StringIO())
+        self.assertTrue(content_hash_storage.exists(self.name))
+
+    def test_references_checked_before_delete(self):
+        self.make_old(self.variant)
+        Recipe.objects.create(
+            author=self.author,
+            name='Рецепт',
+            image=self.name,
+            text='Описание',
+            cooking_time=10,
+        )
+        with mock.patch(
+            'recipes.management.commands.collect_media_garbage.'
+            'count_references',
+            return_value=Counter()
+        ):
+            call_command(
+                'collect_media_garbage', stdout=StringIO())
+        self.assertTrue(content_hash_storage.exists(self.name))
+        self.assertTrue(content_hash_storage.exists(self.variant))
+        Recipe.objects.all().delete()
+        call_command('collect_media_garbage', stdout=StringIO())
+        self.assertFalse(content_hash_storage.exists(self.name))
+        self.assertFalse(content_hash_storage.exists(self.variant))
+
+
+class ShortLinkTest(TestCase):
+    """
+    Новый Рецепт находится по короткой ссылке без перезагрузки карты
+    id: одним запросом по pk, затем - по карте.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='password',
+            first_name='Имя',
+            last_name='Фамилия',
+        )
+
+    def setUp(self):
+        caches['versions'].clear()
+
+    def create_recipe(self):
+        return Recipe.objects.create(
+            author=self.author,
+            name='Рецепт',
+            image='recipes_images/recipe.png',
+            text='Описание',
+            cooking_time=10,
+        )
+
+    def test_new_recipe_found_by_pk(self):
+        old = self.create_recipe()
+        recipe_ids = get_recipe_ids()
+        recipe = self.create_recipe()
+        url = reverse('recipes:short-link', args=[encode(recipe.pk)])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url).status_code, 301)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).status_code, 301)
+            self.assertTrue(recipe_exists(old.pk))
+        self.assertIs(get_recipe_ids(), recipe_ids)
+        with self.assertNumQueries(1):
+            self.assertFalse(recipe_exists(recipe.pk + 1000))
@@ -1,10 +1,13 @@
 from django.urls import path
 
-from .views import redirect_to_recipe
+from .views import redirect_by_code, redirect_to_recipe
+from config.async_views import as_async_urls
 
 
 app_name = 'recipes'
 
-urlpatterns = [
-    path('s/<int:pk>/', redirect_to_recipe, name='short-link'),
-]
+urlpatterns = as_async_urls([
+    # Ссылки по id, выданные до появления кодов.
+    path('s/<int:pk>/', redirect_to_recipe, name='short-link-by-id'),
+    path('s/<str:code>/', redirect_by_code, name='short-link'),
+], ('short-link-by-id', 'short-link'))
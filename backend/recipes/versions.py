@@ -0,0 +1,48 @@
+from time import time_ns
+
+from django.core.cache import caches
+
+
+CATALOG_VERSION_KEY = 'recipes:catalog-version'
+AUTHORS_VERSION_KEY = 'recipes:authors-version'
+RECIPES_VERSION_KEY = 'recipes:recipes-version'
+RECIPES_LIST_VERSION_KEY = 'recipes:recipes-list-version'
+USER_STATE_VERSION_KEY = 'recipes:user-state-version:{user_id}'
+AUTH_VERSION_KEY = 'recipes:auth-version:{user_id}'
+VERSIONS_CACHE = 'versions'
+
+
+def get_version(key):
+    """
+    Версия данных - время их последнего изменения в наносекундах,
+    общее для всех процессов через кэш Django VERSIONS_CACHE. None,
+    если кэш не хранит значения.
+    """
+    cache = caches[VERSIONS_CACHE]
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    caches[VERSIONS_CACHE].set(key, time_ns(), timeout=None)
+
+
+def get_user_state_version(user_id):
+    """Версия Избранного, Списка покупок и Подписок пользователя."""
+    return get_version(USER_STATE_VERSION_KEY.format(user_id=user_id))
+
+
+def bump_user_state_version(user_id):
+    bump_version(USER_STATE_VERSION_KEY.format(user_id=user_id))
+
+
+def get_auth_version(user_id):
+    """Версия токенов, пароля и активности пользователя."""
+    return get_version(AUTH_VERSION_KEY.format(user_id=user_id))
+
+
+def bump_auth_version(user_id):
+    bump_version(AUTH_VERSION_KEY.format(user_id=user_id))
@@ -1,5 +1,24 @@
-from django.shortcuts import redirect
+from django.http import HttpResponseNotFound, HttpResponsePermanentRedirect
+from django.utils.cache import patch_cache_control
+
+from .short_links import decode, recipe_exists
+
+
+SHORT_LINK_MAX_AGE = 24 * 60 * 60
 
 
 def redirect_to_recipe(request, pk):
-    return redirect(request.build_absolute_uri(f'/recipes/{pk}'))
+    """
+    Переход по короткой ссылке: id проверяется по карте Рецептов
+    в памяти (запрос к БД - только для id не из карты), постоянный
+    редирект кэшируется.
+    """
+    if pk is None or not recipe_exists(pk):
+        return HttpResponseNotFound()
+    response = HttpResponsePermanentRedirect(f'/recipes/{pk}')
+    patch_cache_control(response, public=True, max_age=SHORT_LINK_MAX_AGE)
+    return response
+
+
+def redirect_by_code(request, code):
+    return redirect_to_recipe(request, decode(code))